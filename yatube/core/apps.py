@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def clear_cache(sender, **kwargs):
+    """Общий кеш переживает перезапуск, а содержимое базы после миграций
+    (и пересоздания тестовой базы) уже не совпадает с закешированным.
+    """
+    from django.core.cache import cache
+    cache.clear()
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        post_migrate.connect(clear_cache, sender=self)
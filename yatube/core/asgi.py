@@ -0,0 +1,186 @@
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+def build_environ(scope, body):
+    """WSGI environ для HTTP-запроса ASGI; body - файл с телом запроса."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+async def read_body(receive):
+    """Читает тело запроса, не занимая поток; None - клиент ушёл.
+
+    Большие тела (загрузки картинок) уходят во временный файл.
+    """
+    body = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            body.seek(0)
+            return body
+
+
+def watch_disconnect(receive):
+    """asyncio.Event, которое взводится, когда клиент закрыл соединение."""
+    disconnected = asyncio.Event()
+
+    async def watch():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    task = asyncio.ensure_future(watch())
+    return disconnected, task
+
+
+async def start_response(send, status, headers):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers
+        ],
+    })
+
+
+class Bridge:
+    """ASGI-приложение поверх WSGI-приложения Django 2.2.
+
+    Тело запроса читается асинхронно, представления выполняются
+    в ограниченном пуле из ASGI_THREADS потоков. Потоковый ответ
+    отдаётся по куску в своём отдельном потоке: соединения Django
+    с базой привязаны к потоку, и генератор с курсором ORM должен
+    дочитываться и закрываться там же, где начал. routes
+    сопоставляет путям собственные асинхронные обработчики
+    handler(bridge, scope, body, receive, send).
+    """
+
+    def __init__(self, wsgi_application, routes=None):
+        self.wsgi_application = wsgi_application
+        self.routes = routes or {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.ASGI_THREADS, thread_name_prefix='asgi'
+        )
+
+    async def run(self, func, *args, executor=None):
+        return await asyncio.get_event_loop().run_in_executor(
+            executor or self.executor, func, *args
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемое соединение {scope["type"]}')
+        body = await read_body(receive)
+        if body is None:
+            return
+        with body:
+            handler = self.routes.get(scope['path'], Bridge.wsgi)
+            await handler(self, scope, body, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def call_wsgi(self, environ):
+        """Выполняется в пуле: вызывает Django и, если ответ не потоковый,
+        сразу собирает тело, чтобы request_finished сработал в том же
+        потоке, что и представление. Для потокового ответа соединения
+        этого потока закрываются сразу: тело читает другой поток.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        response = self.wsgi_application(environ, start_response)
+        if getattr(response, 'streaming', False):
+            close_old_connections()
+            return started['status'], started['headers'], response
+        try:
+            content = b''.join(response)
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+        return started['status'], started['headers'], content
+
+    async def wsgi(self, scope, body, receive, send):
+        status, headers, content = await self.run(
+            self.call_wsgi, build_environ(scope, body)
+        )
+        await start_response(send, status, headers)
+        if isinstance(content, bytes):
+            await send({'type': 'http.response.body', 'body': content})
+            return
+        await self.stream(content, receive, send)
+
+    async def stream(self, content, receive, send):
+        """Отдаёт потоковый ответ; все куски и close - в одном потоке."""
+        disconnected, watcher = watch_disconnect(receive)
+        chunks = iter(content)
+        executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='asgi-stream'
+        )
+        try:
+            while not disconnected.is_set():
+                chunk = await self.run(next, chunks, None, executor=executor)
+                if chunk is None:
+                    break
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            watcher.cancel()
+            await self.run(content.close, executor=executor)
+            executor.shutdown(wait=False)
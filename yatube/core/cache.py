@@ -0,0 +1,52 @@
+import time
+
+from django.core.cache import cache
+
+
+def _key(namespace):
+    return f'cache_version:{namespace}'
+
+
+def _bumped_key(namespace):
+    return f'cache_bumped:{namespace}'
+
+
+def _fresh_version():
+    return int(time.time() * 1000)
+
+
+def get_version(*namespaces):
+    """Общая версия для набора пространств имён кеша.
+
+    Версия отсутствующего пространства заводится по текущему времени,
+    чтобы после вытеснения ключа не вернуться к старым фрагментам.
+    """
+    keys = [_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _fresh_version(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def last_bumped(*namespaces):
+    """Время последнего bump любого из пространств или None."""
+    return max(cache.get_many([
+        _bumped_key(namespace) for namespace in namespaces
+    ]).values(), default=None)
+
+
+def bump(*namespaces):
+    """Делает недействительным всё, что закешировано под этими версиями."""
+    namespaces = set(namespaces)
+    for namespace in namespaces:
+        key = _key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _fresh_version(), None)
+    now = time.time()
+    cache.set_many({
+        _bumped_key(namespace): now for namespace in namespaces
+    }, None)
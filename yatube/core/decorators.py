@@ -0,0 +1,103 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date, quote_etag
+
+from .cache import get_version, last_bumped
+
+
+def _last_modified(response, namespaces):
+    """Last-Modified ответа, сдвинутый на время последнего bump:
+    правка поста меняет страницу, не меняя дат её записей.
+    """
+    dates = [last_bumped(*namespaces)]
+    if response.has_header('Last-Modified'):
+        dates.append(parse_http_date(response['Last-Modified']))
+    dates = [date for date in dates if date]
+    return http_date(max(dates)) if dates else None
+
+
+def cache_versioned_page(namespaces):
+    """Кеширует ответ целиком для GET-запросов любых пользователей.
+
+    namespaces получает аргументы представления и возвращает пространства
+    версий (core.cache), от которых зависит страница. Повторный запрос
+    с совпавшим ETag получает 304 без обращения к ORM и шаблонам.
+    Подходит только для ответов, не зависящих от пользователя. Ключ
+    строится по полному URL со схемой и хостом: ленты и API отдают
+    абсолютные ссылки.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page_namespaces = namespaces(*args, **kwargs)
+            version = get_version(*page_namespaces)
+            path = hashlib.md5(
+                request.build_absolute_uri().encode()
+            ).hexdigest()
+            key = f'page:{version}:{path}'
+            cached = cache.get(key)
+            if cached is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                response['ETag'] = quote_etag(
+                    hashlib.md5(response.content).hexdigest()
+                )
+                last_modified = _last_modified(response, page_namespaces)
+                if last_modified:
+                    response['Last-Modified'] = last_modified
+                cached = (
+                    response.content,
+                    response['Content-Type'],
+                    response['ETag'],
+                    last_modified,
+                )
+                cache.set(key, cached, settings.PAGE_CACHE_TIMEOUT)
+            else:
+                response = None
+            content, content_type, etag, last_modified = cached
+            not_modified = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=(
+                    parse_http_date(last_modified) if last_modified else None
+                ),
+            )
+            if not_modified is not None:
+                return not_modified
+            if response is None:
+                response = HttpResponse(content, content_type=content_type)
+                response['ETag'] = etag
+                if last_modified:
+                    response['Last-Modified'] = last_modified
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_anonymous_page(namespaces):
+    """Как cache_versioned_page, но только для анонимных пользователей.
+
+    Вошедшие пользователи видят свою шапку и кнопки, их страницы
+    всегда рендерятся заново.
+    """
+    def decorator(view):
+        cached_view = cache_versioned_page(namespaces)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            response = cached_view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
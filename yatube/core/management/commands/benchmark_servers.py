@@ -0,0 +1,105 @@
+import asyncio
+from collections import Counter
+from time import perf_counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Нагрузка на уже запущенный сервер через настоящие сокеты.
+
+    Серверы запускаются отдельно с одним и тем же числом потоков:
+
+        gunicorn yatube.wsgi -w 4
+        uvicorn yatube.asgi:application
+
+    и команда по очереди направляется на каждый. Путь нужен без кеша
+    страниц для анонимов, например /posts/<id>/comments/ или /follow/
+    с --cookie sessionid=...: иначе измеряется кеш, а не сервер.
+    """
+
+    help = (
+        'Нагружает запущенный сервер медленными клиентами и считает '
+        'пропускную способность'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'url', help='Адрес страницы на запущенном сервере'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Сколько запросов отправить'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Сколько клиентов работают одновременно'
+        )
+        parser.add_argument(
+            '--client-delay', type=float, default=50,
+            help='Сколько миллисекунд клиент передаёт заголовки запроса'
+        )
+        parser.add_argument(
+            '--cookie', default='',
+            help='Заголовок Cookie, например sessionid=...'
+        )
+
+    async def request(self, url, options):
+        """Медленный клиент: заголовки уходят двумя частями с паузой."""
+        reader, writer = await asyncio.open_connection(
+            url.hostname, url.port or 80
+        )
+        target = url.path or '/'
+        if url.query:
+            target += f'?{url.query}'
+        writer.write(
+            f'GET {target} HTTP/1.1\r\nHost: {url.netloc}\r\n'.encode()
+        )
+        await writer.drain()
+        await asyncio.sleep(options['client_delay'] / 1000)
+        if options['cookie']:
+            writer.write(f'Cookie: {options["cookie"]}\r\n'.encode())
+        writer.write(b'Connection: close\r\n\r\n')
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        await reader.read()
+        writer.close()
+        return status
+
+    async def run(self, url, options):
+        limit = asyncio.Semaphore(options['concurrency'])
+        statuses = Counter()
+
+        async def client():
+            async with limit:
+                try:
+                    statuses[await self.request(url, options)] += 1
+                except OSError:
+                    statuses['ошибка соединения'] += 1
+
+        await asyncio.gather(*(
+            client() for _ in range(options['requests'])
+        ))
+        return statuses
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Нужен адрес вида http://host:port/path/')
+        loop = asyncio.new_event_loop()
+        started = perf_counter()
+        try:
+            statuses = loop.run_until_complete(self.run(url, options))
+        finally:
+            loop.close()
+        elapsed = perf_counter() - started
+        self.stdout.write(
+            f'{options["url"]}: {options["requests"]} запросов, '
+            f'{options["concurrency"]} клиентов, '
+            f'задержка клиента {options["client_delay"]} мс'
+        )
+        self.stdout.write(
+            f'{options["requests"] / elapsed:8.1f} запросов/с, '
+            f'{elapsed:.2f} с, ответы {dict(statuses)}'
+        )
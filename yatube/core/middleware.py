@@ -0,0 +1,159 @@
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from fnmatch import fnmatchcase
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PARAMETER_LISTS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+TRANSACTION_STATEMENTS = ('BEGIN', 'SAVEPOINT', 'RELEASE', 'ROLLBACK')
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def shape(sql):
+    """SQL без длины списков IN (%s, %s, ...): одинаковые запросы в цикле
+    дают одну и ту же форму.
+    """
+    return PARAMETER_LISTS.sub('(...)', sql)
+
+
+class QueryLog:
+    """Обёртка execute_wrapper: число запросов, время и формы SQL."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.wrote = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - started
+            self.count += 1
+            statement = sql.lstrip().upper()
+            if statement.startswith(WRITE_STATEMENTS):
+                self.wrote = True
+            if not statement.startswith(TRANSACTION_STATEMENTS):
+                self.shapes[shape(sql)] += 1
+
+    def repeated(self, limit):
+        return [
+            (sql, count) for sql, count in self.shapes.most_common()
+            if count > limit
+        ]
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+        )
+
+
+def budget_for(name):
+    """Бюджет представления: QUERY_BUDGETS по имени или шаблону имени,
+    поверх QUERY_BUDGET_DEFAULT.
+    """
+    budget = dict(settings.QUERY_BUDGET_DEFAULT)
+    budgets = settings.QUERY_BUDGETS
+    if name in budgets:
+        budget.update(budgets[name])
+        return budget
+    for pattern, override in budgets.items():
+        if fnmatchcase(name, pattern):
+            budget.update(override)
+            return budget
+    return budget
+
+
+def check(log, name, queries=None, repeated=None, action=None):
+    """Логирует или поднимает QueryBudgetExceeded при превышении бюджета."""
+    problems = []
+    if queries is not None and log.count > queries:
+        problems.append(f'{log.count} запросов при бюджете {queries}')
+    if repeated is not None:
+        problems += [
+            f'{count} одинаковых запросов: {sql}'
+            for sql, count in log.repeated(repeated)
+        ]
+    if not problems:
+        return
+    message = f'{name}: ' + '; '.join(problems)
+    if (action or settings.QUERY_BUDGET_ACTION) == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+@contextmanager
+def record_queries():
+    """Считает запросы ко всем базам внутри блока."""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(log))
+        yield log
+
+
+@contextmanager
+def query_budget(queries=None, repeated=None, name='query_budget',
+                 action=None):
+    """Проверяет бюджет запросов блока кода, например в тестах и командах.
+
+    queries - сколько запросов можно сделать всего, repeated - сколько
+    раз можно повторить запрос одной формы.
+    """
+    with record_queries() as log:
+        yield log
+    check(log, name, queries, repeated, action)
+
+
+class QueryBudgetMiddleware:
+    """Бюджет запросов для каждого представления и заголовок Server-Timing.
+
+    Бюджеты задаются в QUERY_BUDGET_DEFAULT и QUERY_BUDGETS по имени
+    маршрута. Запросы, сделанные при отдаче потокового ответа,
+    не учитываются. Если запрос уже что-то записал в базу (или пришёл
+    не GET-ом), превышение только логируется: ошибка после коммита
+    вернула бы 500 на сохранённые данные. Ответы 5xx не проверяются:
+    отладочная страница ошибки сама делает запросы, и превышение
+    бюджета подменило бы настоящую ошибку.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as log:
+            response = self.get_response(request)
+        timing = log.server_timing()
+        if 'Server-Timing' in response:
+            timing = f'{response["Server-Timing"]}, {timing}'
+        response['Server-Timing'] = timing
+        match = request.resolver_match
+        if match is not None and response.status_code < 500:
+            name = ':'.join(match.app_names + [match.url_name or ''])
+            budget = budget_for(name)
+            action = budget.get('action')
+            if request.method not in SAFE_METHODS or log.wrote:
+                action = 'log'
+            check(
+                log, name,
+                budget.get('queries'),
+                budget.get('repeated'),
+                action,
+            )
+        return response
@@ -0,0 +1,263 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    '''CREATE TABLE IF NOT EXISTS cache_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        entries INTEGER NOT NULL,
+        size INTEGER NOT NULL
+    )''',
+    'INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0)',
+    '''CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache
+    BEGIN
+        UPDATE cache_stats
+        SET entries = entries + 1, size = size + NEW.size WHERE id = 0;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache
+    BEGIN
+        UPDATE cache_stats
+        SET entries = entries - 1, size = size - OLD.size WHERE id = 0;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache
+    BEGIN
+        UPDATE cache_stats
+        SET size = size - OLD.size + NEW.size WHERE id = 0;
+    END''',
+)
+
+# Ограничение SQLite на число параметров в одном запросе.
+MAX_PARAMS = 900
+
+# Время последнего чтения обновляется не чаще раза в секунду,
+# чтобы горячие ключи не превращали каждое чтение в запись.
+ACCESS_RESOLUTION = 1.0
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite в режиме WAL, общий для всех процессов хоста.
+
+    Вытесняет давно не читавшиеся записи, когда превышены MAX_ENTRIES
+    или MAX_SIZE (в байтах), incr атомарен между процессами.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = int(options.get('MAX_SIZE', 0))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            db = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            with db:
+                for statement in SCHEMA:
+                    db.execute(statement)
+            self._local.db = db
+            self._local.pid = pid
+        return self._local.db
+
+    def _write(self):
+        """Транзакция с блокировкой записи с самого начала."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        return _Transaction(db)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _alive(expires, now):
+        return expires is None or expires > now
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            row = db.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and self._alive(row[0], now):
+                return False
+            self._store(db, key, value, timeout, now)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._get_many([key]).get(key, default)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as db:
+            self._store(db, key, value, timeout, time.time())
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            cursor = db.execute(
+                'UPDATE cache SET expires = ?, accessed = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now)
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        self._delete([self._key(key, version)])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = self._get_many(list(keys))
+        return {keys[key]: value for key, value in found.items()}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        with self._write() as db:
+            for key, value in data.items():
+                self._store(db, self._key(key, version), value, timeout, now)
+        return []
+
+    def delete_many(self, keys, version=None):
+        self._delete([self._key(key, version) for key in keys])
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._db.execute(
+            'SELECT expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        return row is not None and self._alive(row[0], time.time())
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or not self._alive(row[1], now):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?',
+                (blob, len(blob), now, key)
+            )
+        return value
+
+    def clear(self):
+        with self._write() as db:
+            db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок потока: открывать файл на каждый
+        # запрос дороже, чем держать его.
+        pass
+
+    def _get_many(self, keys):
+        now = time.time()
+        found = {}
+        expired = []
+        touched = []
+        db = self._db
+        for start in range(0, len(keys), MAX_PARAMS):
+            chunk = keys[start:start + MAX_PARAMS]
+            rows = db.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                'WHERE key IN (%s)' % ', '.join('?' * len(chunk)),
+                chunk
+            )
+            for key, value, expires, accessed in rows:
+                if not self._alive(expires, now):
+                    expired.append(key)
+                    continue
+                found[key] = pickle.loads(value)
+                if accessed < now - ACCESS_RESOLUTION:
+                    touched.append(key)
+        if touched:
+            with self._write() as db:
+                db.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    ((now, key) for key in touched)
+                )
+        if expired:
+            self._delete(expired)
+        return found
+
+    def _store(self, db, key, value, timeout, now):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        db.execute(
+            'INSERT INTO cache (key, value, expires, accessed, size) '
+            'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed, size = excluded.size',
+            (key, blob, self.get_backend_timeout(timeout), now, len(blob))
+        )
+        self._cull(db, now)
+
+    def _over_limit(self, db):
+        """Число записей, если кеш вышел за пределы, иначе 0."""
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_stats WHERE id = 0'
+        ).fetchone()
+        over_size = self._max_size and size > self._max_size
+        return entries if entries > self._max_entries or over_size else 0
+
+    def _cull(self, db, now):
+        if not self._over_limit(db):
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        entries = self._over_limit(db)
+        while entries:
+            if self._cull_frequency == 0:
+                db.execute('DELETE FROM cache')
+                return
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(entries // self._cull_frequency, 1),)
+            )
+            entries = self._over_limit(db)
+
+    def _delete(self, keys):
+        with self._write() as db:
+            for start in range(0, len(keys), MAX_PARAMS):
+                chunk = keys[start:start + MAX_PARAMS]
+                db.execute(
+                    'DELETE FROM cache WHERE key IN (%s)'
+                    % ', '.join('?' * len(chunk)),
+                    chunk
+                )
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
@@ -0,0 +1,17 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from yatube.test_settings import OVERRIDES
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты с настройками yatube.test_settings."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.overrides = override_settings(**OVERRIDES)
+        self.overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.overrides.disable()
+        super().teardown_test_environment(**kwargs)
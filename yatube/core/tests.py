@@ -1,4 +1,28 @@
-from django.test import TestCase
+import asyncio
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings
+)
+from django.urls import resolve, reverse
+
+from .asgi import Bridge
+from .middleware import (
+    QueryBudgetExceeded, QueryBudgetMiddleware, query_budget
+)
+from .sqlite_cache import SQLiteCache
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +30,256 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+def increment(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """get/set/add/delete и пакетные операции"""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'value'))
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 2}
+        )
+        self.cache.delete_many(['a', 'b'])
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('expired', 1, timeout=-1)
+        self.assertFalse(self.cache.has_key('expired'))
+
+    def test_shared_between_instances(self):
+        """Второй экземпляр видит записи первого"""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_incr_is_atomic_across_processes(self):
+        """incr из нескольких процессов не теряет обновлений"""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    @mock.patch('core.sqlite_cache.ACCESS_RESOLUTION', 0)
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся записи"""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get_many(['a', 'c', 'd']), {
+            'a': 'a', 'c': 'c', 'd': 'd'
+        })
+
+    def test_size_limit(self):
+        """Суммарный размер не превышает MAX_SIZE"""
+        cache = self.make_cache(MAX_SIZE=4096)
+        for number in range(10):
+            cache.set(f'key{number}', 'x' * 1000)
+        self.assertLessEqual(
+            sum(len(value) for value in cache.get_many(
+                [f'key{number}' for number in range(10)]
+            ).values()),
+            4096
+        )
+        self.assertEqual(cache.get('key9'), 'x' * 1000)
+
+
+def call(application, scope, chunks=(b'',)):
+    """Прогоняет один запрос через ASGI-приложение, возвращает сообщения."""
+    incoming = [
+        {'type': 'http.request', 'body': chunk, 'more_body': True}
+        for chunk in chunks
+    ]
+    incoming[-1]['more_body'] = False
+    sent = []
+
+    async def receive():
+        if incoming:
+            return incoming.pop(0)
+        await asyncio.sleep(10)
+
+    async def send(message):
+        sent.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(application(scope, receive, send))
+    finally:
+        loop.close()
+    return sent
+
+
+def http_scope(path, method='GET', headers=()):
+    path, _, query = path.partition('?')
+    return {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'host', b'testserver'), *headers],
+    }
+
+
+class BridgeTest(TransactionTestCase):
+    def setUp(self):
+        self.application = Bridge(WSGIHandler())
+        self.addCleanup(self.application.executor.shutdown)
+
+    def test_page_through_thread_pool(self):
+        """Обычная страница отдаётся целиком одним сообщением"""
+        sent = call(self.application, http_scope('/about/author/'))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/html; charset=utf-8'), sent[0]['headers']
+        )
+        self.assertIn('Об авторе'.encode(), sent[1]['body'])
+
+    def test_stream_stays_on_one_thread(self):
+        """Куски потокового ответа и его закрытие идут в одном потоке"""
+        threads = []
+
+        def chunks():
+            try:
+                for _ in range(3):
+                    threads.append(threading.current_thread().name)
+                    yield b'chunk'
+            finally:
+                threads.append(threading.current_thread().name)
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return StreamingHttpResponse(chunks())
+
+        bridge = Bridge(application)
+        self.addCleanup(bridge.executor.shutdown)
+        sent = call(bridge, http_scope('/'))
+        self.assertEqual(
+            b''.join(message.get('body', b'') for message in sent[1:]),
+            b'chunk' * 3
+        )
+        self.assertEqual(len(threads), 4)
+        self.assertEqual(len(set(threads)), 1)
+        self.assertTrue(threads[0].startswith('asgi-stream'))
+
+    def test_body_read_in_chunks(self):
+        """Тело POST собирается из нескольких сообщений"""
+        token = 'a' * 32
+        chunks = [
+            f'csrfmiddlewaretoken={token}&'.encode(),
+            b'username=nobody&',
+            b'password=x',
+        ]
+        sent = call(
+            self.application,
+            http_scope('/auth/login/', 'POST', [
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(b''.join(chunks))).encode()),
+                (b'cookie', f'csrftoken={token}'.encode()),
+            ]),
+            chunks,
+        )
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(b'value="nobody"', sent[1]['body'])
+
+    def test_lifespan(self):
+        """Сервер получает подтверждение запуска и остановки"""
+        incoming = [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}
+        ]
+        sent = []
+
+        async def receive():
+            return incoming.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.new_event_loop().run_until_complete(
+            self.application({'type': 'lifespan'}, receive, send)
+        )
+        self.assertEqual(
+            sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+        )
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f'user{number}')
+            for number in range(5)
+        ]
+
+    def test_repeated_queries_detected(self):
+        """Одинаковые запросы в цикле считаются одной формой"""
+        with self.assertRaises(QueryBudgetExceeded) as error:
+            with query_budget(repeated=3, action='raise'):
+                for user in self.users:
+                    list(User.objects.filter(pk__in=[user.pk, 0]))
+        self.assertIn('5 одинаковых запросов', str(error.exception))
+        with query_budget(queries=1, repeated=1, action='raise') as log:
+            list(User.objects.filter(pk__in=[user.pk for user in self.users]))
+        self.assertEqual(log.count, 1)
+
+    def test_log_instead_of_raise(self):
+        """В режиме log превышение только пишется в лог"""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            with query_budget(queries=0, name='check', action='log'):
+                User.objects.count()
+        self.assertIn('check: 1 запросов при бюджете 0', logs.output[0])
+
+    def test_middleware(self):
+        """Ответ несёт Server-Timing, бюджет маршрута проверяется"""
+        response = self.client.get('/about/author/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        cache.clear()
+        with override_settings(QUERY_BUDGETS={'posts:*': {'queries': 0}}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('posts:main_page'))
+            self.client.get('/about/author/')
+
+    def test_server_error_not_replaced(self):
+        """Ответ 500 отдаётся как есть, без проверки бюджета"""
+        def view(status):
+            def get_response(request):
+                list(User.objects.all())
+                list(User.objects.all())
+                return HttpResponse(status=status)
+            return get_response
+
+        request = RequestFactory().get('/')
+        request.resolver_match = resolve('/')
+        with override_settings(QUERY_BUDGETS={'posts:*': {'queries': 1}}):
+            with self.assertRaises(QueryBudgetExceeded):
+                QueryBudgetMiddleware(view(200))(request)
+            response = QueryBudgetMiddleware(view(500))(request)
+        self.assertEqual(response.status_code, 500)
@@ -1,6 +1,21 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.cache import cache
 
+from core.admin import (
+    EstimatedCountPaginator, IdFilter, RangeSearchMixin, prefix_filter
+)
+from core.cache import get_version
+from . import moderation
 from .models import Comment, Follow, Group, Post
+from .search import filter_posts, match_query
+
+
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа'
+    )
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -12,9 +27,91 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group', 'text',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
+    action_form = PostActionForm
+    actions = (
+        'move_to_group',
+        'detach_from_group',
+        'delete_authors_content',
+        'purge_authors_follows',
+    )
+
+    def move_to_group(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid() or form.cleaned_data['group'] is None:
+            self.message_user(
+                request, 'Выберите группу', level=messages.ERROR
+            )
+            return
+        group = form.cleaned_data['group']
+        moved = moderation.move_posts(
+            queryset.values_list('pk', flat=True), group.pk
+        )
+        self.message_user(request, f'Перенесено в «{group}»: {moved}')
+    move_to_group.allowed_permissions = ('change',)
+    move_to_group.short_description = 'Перенести в выбранную группу'
+
+    def detach_from_group(self, request, queryset):
+        moved = moderation.move_posts(
+            queryset.values_list('pk', flat=True), None
+        )
+        self.message_user(request, f'Убрано из групп: {moved}')
+    detach_from_group.allowed_permissions = ('change',)
+    detach_from_group.short_description = 'Убрать из групп'
+
+    def delete_authors_content(self, request, queryset):
+        posts, comments = moderation.delete_authors_content(
+            queryset.values_list('author_id', flat=True).distinct()
+        )
+        self.message_user(
+            request, f'Удалено постов: {posts}, комментариев: {comments}'
+        )
+    delete_authors_content.allowed_permissions = ('delete',)
+    delete_authors_content.short_description = (
+        'Удалить все посты и комментарии авторов'
+    )
+
+    def purge_authors_follows(self, request, queryset):
+        deleted = moderation.purge_follows(
+            queryset.values_list('author_id', flat=True).distinct()
+        )
+        self.message_user(request, f'Удалено подписок: {deleted}')
+    purge_authors_follows.allowed_permissions = ('delete',)
+    purge_authors_follows.short_description = (
+        'Удалить подписки авторов и на авторов'
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('author', 'group')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs
+        )
+        if db_field.name == 'group':
+            formfield.choices = cache.get_or_set(
+                f'admin_group_choices:{get_version("groups")}',
+                lambda: list(formfield.choices)
+            )
+        return formfield
+
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('widgets', {
+            'text': forms.Textarea(attrs={'rows': 2, 'cols': 60})
+        })
+        return super().get_changelist_form(request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not match_query(search_term):
+            return queryset, False
+        return filter_posts(queryset, search_term), False
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -26,16 +123,37 @@ class GroupAdmin(admin.ModelAdmin):
     list_filter = ('title',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class PostIdFilter(IdFilter):
+    title = 'номеру поста'
+    parameter_name = 'post'
+
+
+class CommentAdmin(RangeSearchMixin, admin.ModelAdmin):
     list_display = ('text', 'author', 'post', 'created',)
-    search_fields = ('text', 'author',)
-    list_filter = ('created', 'post',)
+    list_select_related = ('author', 'post')
+    search_fields = ('text', '^author__username',)
+    list_filter = (
+        'created',
+        PostIdFilter,
+        prefix_filter('author__username', 'автору'),
+    )
+    autocomplete_fields = ('post', 'author')
+    ordering = ('-pk',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(RangeSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'author',)
-    search_fields = ('user', 'author',)
-    list_filter = ('user', 'author',)
+    list_select_related = ('user', 'author')
+    search_fields = ('^user__username', '^author__username',)
+    list_filter = (
+        prefix_filter('user__username', 'подписчику'),
+        prefix_filter('author__username', 'автору'),
+    )
+    autocomplete_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,221 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag, urlencode
+
+from core.decorators import cache_anonymous_page
+
+from . import thumbnails
+from .models import Group, Post, User
+from .timeline import FeedPaginator
+from .utils import (
+    CursorPaginator, group_namespaces, index_namespaces, profile_namespaces
+)
+
+FIELDS = {
+    'id': ('id',),
+    'text': ('text',),
+    'pub_date': ('pub_date',),
+    'comments_count': ('comments_count',),
+    'author': (
+        'author', 'author__id', 'author__username',
+        'author__first_name', 'author__last_name',
+    ),
+    'group': ('group', 'group__id', 'group__slug', 'group__title'),
+    'image': (
+        'image', 'image_width', 'image_height',
+        'image_placeholder', 'thumbnails_ready', 'thumbnail_files',
+    ),
+}
+
+RELATED = ('author', 'group')
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def requested_fields(request):
+    """Поля из параметра fields=, по умолчанию все."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return tuple(FIELDS)
+    fields = tuple(dict.fromkeys(
+        field.strip() for field in raw.split(',') if field.strip()
+    ))
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise FieldsError(f'Неизвестные поля: {", ".join(unknown)}')
+    return fields
+
+
+def posts_queryset(fields, queryset=None):
+    """Загружает только нужные колонки, автора и группу - тем же запросом.
+
+    id и pub_date нужны курсору и выбираются всегда.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    columns = {'id', 'pub_date'}
+    for field in fields:
+        columns.update(FIELDS[field])
+    related = [field for field in RELATED if field in fields]
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*sorted(columns))
+
+
+def serialize_author(author):
+    return {
+        'id': author.id,
+        'username': author.username,
+        'full_name': author.get_full_name(),
+    }
+
+
+def serialize_group(group):
+    if group is None:
+        return None
+    return {'id': group.id, 'slug': group.slug, 'title': group.title}
+
+
+def serialize_image(request, post):
+    if not post.image:
+        return None
+    return {
+        'url': request.build_absolute_uri(post.image.url),
+        'width': post.image_width,
+        'height': post.image_height,
+        'placeholder': post.image_placeholder,
+        'thumbnail': (
+            request.build_absolute_uri(post.thumbnail.url)
+            if post.thumbnail else None
+        ),
+        'sources': [
+            {
+                'type': source['type'],
+                'srcset': thumbnails.srcset(
+                    source['thumbnails'], request.build_absolute_uri
+                ),
+            }
+            for source in post.thumbnail_sources
+        ],
+    }
+
+
+def serialize_post(request, post, fields):
+    data = {}
+    for field in fields:
+        if field == 'author':
+            data[field] = serialize_author(post.author)
+        elif field == 'group':
+            data[field] = serialize_group(post.group)
+        elif field == 'image':
+            data[field] = serialize_image(request, post)
+        elif field == 'pub_date':
+            data[field] = post.pub_date.isoformat()
+        else:
+            data[field] = getattr(post, field)
+    return data
+
+
+def page_url(request, cursor):
+    if not cursor:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(
+        f'{request.path}?{urlencode(sorted(query.items()))}'
+    )
+
+
+def json_response(request, data, status=200):
+    """JSON с ETag по содержимому; совпавший If-None-Match получает 304."""
+    response = JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+    if status != 200:
+        return response
+    response['ETag'] = quote_etag(hashlib.md5(response.content).hexdigest())
+    return get_conditional_response(
+        request, etag=response['ETag'], response=response
+    )
+
+
+def error(request, message, status):
+    return json_response(request, {'detail': message}, status)
+
+
+def posts_page(request, paginator, fields):
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    if 'image' in fields:
+        thumbnails.preload(page_obj)
+    return json_response(request, {
+        'results': [
+            serialize_post(request, post, fields) for post in page_obj
+        ],
+        'next': page_url(request, page_obj.next_cursor),
+        'previous': page_url(request, page_obj.previous_cursor),
+    })
+
+
+def feed(view):
+    """Разбирает fields= и превращает ошибку в ответ 400."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            fields = requested_fields(request)
+        except FieldsError as exc:
+            return error(request, str(exc), 400)
+        return view(request, fields, *args, **kwargs)
+    return wrapper
+
+
+@cache_anonymous_page(index_namespaces)
+@feed
+def index(request, fields):
+    paginator = CursorPaginator(posts_queryset(fields), settings.PAGE_NUMBER)
+    return posts_page(request, paginator, fields)
+
+
+@cache_anonymous_page(group_namespaces)
+@feed
+def group_posts(request, fields, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return error(request, 'Группа не найдена', 404)
+    paginator = CursorPaginator(
+        posts_queryset(fields, Post.objects.filter(group_id=group_id)),
+        settings.PAGE_NUMBER
+    )
+    return posts_page(request, paginator, fields)
+
+
+@cache_anonymous_page(profile_namespaces)
+@feed
+def profile(request, fields, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return error(request, 'Автор не найден', 404)
+    paginator = CursorPaginator(
+        posts_queryset(fields, Post.objects.filter(author_id=author_id)),
+        settings.PAGE_NUMBER
+    )
+    return posts_page(request, paginator, fields)
+
+
+@feed
+def follow_index(request, fields):
+    if not request.user.is_authenticated:
+        return error(request, 'Нужна авторизация', 401)
+    paginator = FeedPaginator(
+        request.user, settings.PAGE_NUMBER, posts_queryset(fields)
+    )
+    return posts_page(request, paginator, fields)
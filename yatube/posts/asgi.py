@@ -0,0 +1,115 @@
+import asyncio
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+
+from core.asgi import Bridge, build_environ, start_response, watch_disconnect
+from . import events
+
+
+def session_user(environ):
+    """Пользователь по cookie сессии, как в AuthenticationMiddleware."""
+    request = WSGIRequest(environ)
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    try:
+        return get_user(request)
+    finally:
+        close_old_connections()
+
+
+def poll(user, last_id):
+    """Новые события после last_id: (новый last_id, сообщения SSE)."""
+    try:
+        found = events.fetch(last_id)
+        if not found:
+            return last_id, []
+        return found[-1].pk, events.messages(user, found)
+    finally:
+        close_old_connections()
+
+
+def start(last_id):
+    try:
+        return events.last_event_id() if last_id is None else last_id
+    finally:
+        close_old_connections()
+
+
+async def follow_events(bridge, scope, body, receive, send):
+    """Асинхронная версия views.follow_events.
+
+    Между опросами соединение не держит поток пула: ожидание идёт
+    в цикле событий, а публикация в этом процессе будит его сразу.
+    """
+    environ = build_environ(scope, body)
+    user = await bridge.run(session_user, environ)
+    if not user.is_authenticated:
+        await Bridge.wsgi(bridge, scope, body, receive, send)
+        return
+    last_id = environ.get('HTTP_LAST_EVENT_ID', '')
+    last_id = await bridge.run(
+        start, int(last_id) if last_id.isdigit() else None
+    )
+    loop = asyncio.get_event_loop()
+    wake = asyncio.Event()
+
+    def notify():
+        loop.call_soon_threadsafe(wake.set)
+
+    events.subscribe(notify)
+    disconnected, watcher = watch_disconnect(receive)
+    await start_response(send, 200, [
+        ('Content-Type', 'text/event-stream'),
+        ('Cache-Control', 'no-cache'),
+        ('X-Accel-Buffering', 'no'),
+    ])
+
+    async def write(text):
+        await send({
+            'type': 'http.response.body',
+            'body': text.encode(),
+            'more_body': True,
+        })
+
+    try:
+        await write(f'retry: {settings.POST_EVENTS_RETRY}\n\n')
+        deadline = time.monotonic() + settings.POST_EVENTS_STREAM_DURATION
+        quiet_since = time.monotonic()
+        while time.monotonic() < deadline and not disconnected.is_set():
+            wake.clear()
+            last_id, sent = await bridge.run(poll, user, last_id)
+            for text in sent:
+                await write(text)
+            if sent:
+                quiet_since = time.monotonic()
+            elif (
+                time.monotonic() - quiet_since
+                >= settings.POST_EVENTS_KEEPALIVE
+            ):
+                await write(': keepalive\n\n')
+                quiet_since = time.monotonic()
+            waiters = [
+                asyncio.ensure_future(wake.wait()),
+                asyncio.ensure_future(disconnected.wait()),
+            ]
+            await asyncio.wait(
+                waiters,
+                timeout=min(
+                    settings.POST_EVENTS_POLL_INTERVAL,
+                    max(deadline - time.monotonic(), 0)
+                ),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for waiter in waiters:
+                waiter.cancel()
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        events.unsubscribe(notify)
+        watcher.cancel()
@@ -0,0 +1,113 @@
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def shifted(field, delta):
+    """F(field) + delta, не ниже нуля: разошедшийся счётчик чинит recount."""
+    return Greatest(F(field) + delta, 0)
+
+
+def shift_user(user_id, **deltas):
+    UserStats.objects.filter(user_id=user_id).update(**{
+        field: shifted(field, delta) for field, delta in deltas.items()
+    })
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=shifted('posts_count', delta)
+        )
+
+
+def shift_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=shifted('comments_count', delta)
+    )
+
+
+def chunks(queryset, size):
+    """Списки pk queryset порциями по size штук, по возрастанию pk."""
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(page[:size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def _grouped(queryset, field, ids):
+    return dict(queryset.filter(**{f'{field}__in': ids}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values_list(field, 'total'))
+
+
+def recount_users(ids):
+    """Пересчитывает счётчики пользователей, возвращает число исправленных."""
+    posts = _grouped(Post.objects, 'author_id', ids)
+    followers = _grouped(Follow.objects, 'author_id', ids)
+    following = _grouped(Follow.objects, 'user_id', ids)
+    existing = UserStats.objects.in_bulk(ids)
+    changed = []
+    for user_id in ids:
+        stats = existing.get(user_id) or UserStats(user_id=user_id)
+        actual = (
+            posts.get(user_id, 0),
+            followers.get(user_id, 0),
+            following.get(user_id, 0),
+        )
+        stored = (
+            stats.posts_count, stats.followers_count, stats.following_count
+        )
+        if user_id in existing and actual == stored:
+            continue
+        stats.posts_count, stats.followers_count, stats.following_count = (
+            actual
+        )
+        changed.append(stats)
+    UserStats.objects.bulk_create(
+        [stats for stats in changed if stats.user_id not in existing]
+    )
+    UserStats.objects.bulk_update(
+        [stats for stats in changed if stats.user_id in existing],
+        ('posts_count', 'followers_count', 'following_count'),
+    )
+    return len(changed)
+
+
+def recount_groups(ids):
+    actual = _grouped(Post.objects, 'group_id', ids)
+    changed = [
+        group for group in Group.objects.filter(pk__in=ids)
+        if group.posts_count != actual.get(group.pk, 0)
+    ]
+    for group in changed:
+        group.posts_count = actual.get(group.pk, 0)
+    Group.objects.bulk_update(changed, ('posts_count',))
+    return len(changed)
+
+
+def recount_posts(ids):
+    actual = _grouped(Comment.objects, 'post_id', ids)
+    changed = [
+        post for post in Post.objects.filter(pk__in=ids).only(
+            'pk', 'comments_count'
+        )
+        if post.comments_count != actual.get(post.pk, 0)
+    ]
+    for post in changed:
+        post.comments_count = actual.get(post.pk, 0)
+    Post.objects.bulk_update(changed, ('comments_count',))
+    return len(changed)
+
+
+RECOUNTERS = (
+    (User.objects, recount_users),
+    (Group.objects, recount_groups),
+    (Post.objects, recount_posts),
+)
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+
+from .models import Follow, Post, PostEvent
+
+_condition = threading.Condition()
+_listeners = set()
+
+
+def subscribe(callback):
+    """callback вызывается из потока, закоммитившего новый пост."""
+    _listeners.add(callback)
+
+
+def unsubscribe(callback):
+    _listeners.discard(callback)
+
+
+def _notify():
+    with _condition:
+        _condition.notify_all()
+    for callback in list(_listeners):
+        callback()
+
+
+def publish(post):
+    """Записывает событие о новом посте в той же транзакции, что и пост.
+
+    Слушатели этого процесса просыпаются сразу после коммита, других
+    процессов - на следующем опросе таблицы событий.
+    """
+    event = PostEvent.objects.create(post=post, author_id=post.author_id)
+    PostEvent.objects.filter(
+        pk__lte=event.pk - settings.POST_EVENTS_KEEP
+    ).delete()
+    transaction.on_commit(_notify)
+
+
+def last_event_id():
+    return PostEvent.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    ).first() or 0
+
+
+def fetch(after_id):
+    return list(PostEvent.objects.filter(pk__gt=after_id).order_by('pk')[
+        :settings.POST_EVENTS_BATCH
+    ])
+
+
+def wait(after_id, timeout):
+    """События после after_id; если их нет, ждёт не дольше timeout."""
+    events = fetch(after_id)
+    if events:
+        return events
+    with _condition:
+        _condition.wait(timeout)
+    return fetch(after_id)
+
+
+def followed(user, events):
+    """Оставляет события авторов, на которых пользователь подписан сейчас."""
+    authors = set(Follow.objects.filter(
+        user=user, author_id__in={event.author_id for event in events}
+    ).values_list('author_id', flat=True))
+    return [event for event in events if event.author_id in authors]
+
+
+def message(event, post):
+    data = {
+        'id': post.pk,
+        'author': post.author.username,
+        'group': post.group.slug if post.group else None,
+        'text': str(post),
+        'url': reverse('posts:post_detail', args=(post.pk,)),
+    }
+    return (
+        f'id: {event.pk}\nevent: post\n'
+        f'data: {json.dumps(data, ensure_ascii=False)}\n\n'
+    )
+
+
+def messages(user, events):
+    """Сообщения SSE для тех событий, что относятся к подпискам user."""
+    events = followed(user, events)
+    if not events:
+        return []
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [event.post_id for event in events]
+    )
+    return [
+        message(event, posts[event.post_id])
+        for event in events if event.post_id in posts
+    ]
+
+
+def stream(user, last_id=None, duration=None, retry=None):
+    """Поток SSE о новых постах в подписках пользователя.
+
+    Поток закрывается через duration секунд (POST_EVENTS_STREAM_DURATION),
+    клиент переподключается через retry миллисекунд с Last-Event-ID
+    и не теряет событий.
+    """
+    if last_id is None:
+        last_id = last_event_id()
+    if duration is None:
+        duration = settings.POST_EVENTS_STREAM_DURATION
+    yield f'retry: {retry or settings.POST_EVENTS_RETRY}\n\n'
+    deadline = time.monotonic() + duration
+    quiet_since = time.monotonic()
+    while time.monotonic() < deadline:
+        events = wait(last_id, min(
+            settings.POST_EVENTS_POLL_INTERVAL,
+            max(deadline - time.monotonic(), 0)
+        ))
+        if events:
+            last_id = events[-1].pk
+        sent = messages(user, events) if events else []
+        yield from sent
+        if sent:
+            quiet_since = time.monotonic()
+        elif (
+            time.monotonic() - quiet_since
+            >= settings.POST_EVENTS_KEEPALIVE
+        ):
+            yield ': keepalive\n\n'
+            quiet_since = time.monotonic()
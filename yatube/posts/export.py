@@ -0,0 +1,149 @@
+import json
+import zipfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, Post
+
+BLOCK_SIZE = 64 * 1024
+
+
+def keyset_rows(queryset, *fields):
+    """Строки queryset по возрастанию pk порциями EXPORT_CHUNK_SIZE.
+
+    Каждая порция - отдельный запрос по ключу, так что ни курсор базы,
+    ни память не растут с числом строк.
+    """
+    size = settings.EXPORT_CHUNK_SIZE
+    queryset = queryset.order_by('pk').values('pk', *fields)
+    last_pk = 0
+    while True:
+        count = 0
+        for row in queryset.filter(pk__gt=last_pk)[:size].iterator(
+            chunk_size=size
+        ):
+            count += 1
+            last_pk = row.pop('pk')
+            yield row
+        if count < size:
+            return
+
+
+def _date(value):
+    return value.isoformat() if value else None
+
+
+def records(user):
+    """Данные пользователя в формате команды import_data."""
+    yield {
+        'model': 'user',
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email,
+    }
+    for group in Group.objects.filter(
+        pk__in=Post.objects.filter(author=user).values('group_id')
+    ).values('slug', 'title', 'description'):
+        yield {'model': 'group', **group}
+    for row in keyset_rows(
+        Post.objects.filter(author=user),
+        'id', 'group__slug', 'text', 'pub_date', 'image'
+    ):
+        yield {
+            'model': 'post',
+            'id': row['id'],
+            'author': user.username,
+            'group': row['group__slug'],
+            'text': row['text'],
+            'pub_date': _date(row['pub_date']),
+            'image': row['image'],
+        }
+    for row in keyset_rows(
+        Comment.objects.filter(author=user),
+        'id', 'post_id', 'text', 'created'
+    ):
+        yield {
+            'model': 'comment',
+            'id': row['id'],
+            'post': row['post_id'],
+            'author': user.username,
+            'text': row['text'],
+            'created': _date(row['created']),
+        }
+    for row in keyset_rows(
+        Follow.objects.filter(Q(user=user) | Q(author=user)),
+        'user__username', 'author__username'
+    ):
+        yield {
+            'model': 'follow',
+            'user': row['user__username'],
+            'author': row['author__username'],
+        }
+
+
+def jsonl(user):
+    """JSONL кусками примерно по BLOCK_SIZE байт."""
+    lines = []
+    size = 0
+    for record in records(user):
+        line = json.dumps(record, ensure_ascii=False).encode() + b'\n'
+        lines.append(line)
+        size += len(line)
+        if size >= BLOCK_SIZE:
+            yield b''.join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield b''.join(lines)
+
+
+class _Output:
+    """Несмещаемый поток для ZipFile: копит записанное до выдачи."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def archive(user):
+    """ZIP с data.jsonl и картинками постов, собираемый на лету.
+
+    Картинки уже сжаты и кладутся без сжатия, файлы читаются блоками.
+    """
+    output = _Output()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('data.jsonl', 'w', force_zip64=True) as file:
+            for chunk in jsonl(user):
+                file.write(chunk)
+                yield output.pop()
+        images = Post.objects.filter(author=user).exclude(image='')
+        for row in keyset_rows(images, 'image'):
+            name = row['image']
+            try:
+                source = default_storage.open(name)
+            except OSError:
+                continue
+            info = zipfile.ZipInfo(
+                f'media/{name}', timezone.now().timetuple()[:6]
+            )
+            info.compress_type = zipfile.ZIP_STORED
+            with source, archive.open(info, 'w', force_zip64=True) as file:
+                for block in iter(lambda: source.read(BLOCK_SIZE), b''):
+                    file.write(block)
+                    yield output.pop()
+    yield output.pop()
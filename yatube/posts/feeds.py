@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+
+from core.decorators import cache_versioned_page
+from .models import Group, Post, User
+from .utils import group_namespaces, index_namespaces, profile_namespaces
+
+
+class LatestPostsFeed(Feed):
+    title = 'Yatube: новые записи'
+    description = 'Последние записи всех авторов'
+
+    def link(self):
+        return reverse('posts:main_page')
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj):
+        return self.posts(obj).select_related(
+            'author', 'group'
+        )[:settings.FEED_LENGTH]
+
+    def item_title(self, item):
+        return str(item)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=(item.pk,))
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_author_link(self, item):
+        return reverse('posts:profile', args=(item.author.username,))
+
+    def item_categories(self, item):
+        return (item.group.title,) if item.group else ()
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return f'Yatube: {obj.title}'
+
+    def description(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return reverse('posts:group_posts_page', args=(obj.slug,))
+
+    def posts(self, obj):
+        return Post.objects.filter(group=obj)
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f'Yatube: {obj.get_full_name() or obj.username}'
+
+    def description(self, obj):
+        return f'Записи пользователя {obj.username}'
+
+    def link(self, obj):
+        return reverse('posts:profile', args=(obj.username,))
+
+    def posts(self, obj):
+        return Post.objects.filter(author=obj)
+
+
+def atom(feed_class):
+    return type(
+        f'{feed_class.__name__}Atom',
+        (feed_class,),
+        {'feed_type': Atom1Feed, 'subtitle': feed_class.description},
+    )
+
+
+index_rss = cache_versioned_page(index_namespaces)(LatestPostsFeed())
+index_atom = cache_versioned_page(index_namespaces)(atom(LatestPostsFeed)())
+group_rss = cache_versioned_page(group_namespaces)(GroupPostsFeed())
+group_atom = cache_versioned_page(group_namespaces)(atom(GroupPostsFeed)())
+profile_rss = cache_versioned_page(profile_namespaces)(AuthorPostsFeed())
+profile_atom = cache_versioned_page(profile_namespaces)(
+    atom(AuthorPostsFeed)()
+)
@@ -1,5 +1,6 @@
 from django import forms
 
+from .images import normalize
 from .models import Post, Comment
 
 
@@ -10,6 +11,25 @@ class PostForm(forms.ModelForm):
         labels = {'text': 'Текст сюда', 'group': 'Любую или никакую группу'}
         help_texts = {'text': 'Всё что угодно', 'group': 'Из предложеных :)'}
 
+    image_meta = (None, None, '')
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if 'image' in self.changed_data and image:
+            image, size, placeholder = normalize(image)
+            self.image_meta = (*size, placeholder)
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            self.instance.thumbnails_ready = False
+            self.instance.thumbnail_files = ''
+            width, height, placeholder = self.image_meta
+            self.instance.image_width = width
+            self.instance.image_height = height
+            self.instance.image_placeholder = placeholder
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
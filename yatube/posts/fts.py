@@ -0,0 +1,53 @@
+from django.db import connections
+
+# Схема индекса одна для миграции 0015 и для ensure_index.
+TABLE = 'posts_post_fts'
+
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+
+TRIGGERS = {
+    'posts_post_fts_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {TABLE} (rowid, text) VALUES (new.id, new.text);
+        END''',
+    'posts_post_fts_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {TABLE} ({TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END''',
+    'posts_post_fts_update': f'''
+        CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {TABLE} ({TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {TABLE} (rowid, text) VALUES (new.id, new.text);
+        END''',
+}
+
+REBUILD = f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')"
+
+
+def ensure_index(using='default', **kwargs):
+    """Возвращает триггеры индекса, если миграция пересоздала posts_post.
+
+    SQLite меняет схему через копию таблицы, и триггеры при этом
+    пропадают; после их восстановления индекс перестраивается целиком.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            (f'{TABLE}%',)
+        )
+        names = {name for name, in cursor.fetchall()}
+        if TABLE not in names or names >= set(TRIGGERS):
+            return
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(REBUILD)
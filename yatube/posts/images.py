@@ -0,0 +1,111 @@
+import base64
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, ImageSequence
+
+ORIENTATION = 0x0112
+
+
+def normalize(upload):
+    """Готовит загруженную картинку к хранению.
+
+    Размер в пикселях проверяется по заголовку, до распаковки, JPEG
+    декодируется сразу в уменьшенном масштабе. Картинка поворачивается
+    по EXIF, ужимается до IMAGE_MAX_SIDE и сохраняется без метаданных;
+    анимация - так же кадр за кадром, если во всех кадрах вместе не
+    больше IMAGE_MAX_ANIMATION_PIXELS.
+    Возвращает (файл, (ширина, высота), превью): превью - data URI
+    из placeholder.
+    """
+    if upload.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError('Файл слишком большой')
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError('Картинка слишком большая')
+    if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError('Картинка слишком большая')
+    side = settings.IMAGE_MAX_SIDE
+    if getattr(image, 'is_animated', False):
+        content, first = _animation(image, side)
+        return (
+            ContentFile(content, name=upload.name),
+            first.size,
+            placeholder(first),
+        )
+    image_format = image.format
+    image.draft(image.mode, (side, side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((side, side), Image.LANCZOS)
+    image.info = {
+        key: value for key, value in image.info.items()
+        if key in ('icc_profile', 'transparency')
+    }
+    options = dict(image.info)
+    if image_format == 'JPEG':
+        options.update(quality=settings.IMAGE_QUALITY, optimize=True)
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return (
+        ContentFile(buffer.getvalue(), name=upload.name),
+        image.size,
+        placeholder(image),
+    )
+
+
+def _animation(image, side):
+    """Анимация, ужатая кадр за кадром, и её первый кадр.
+
+    Из метаданных остаются только длительности кадров и число повторов.
+    """
+    total = image.width * image.height * image.n_frames
+    if total > settings.IMAGE_MAX_ANIMATION_PIXELS:
+        raise ValidationError('Анимация слишком большая')
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frame = ImageOps.exif_transpose(frame).convert('RGBA')
+        frame.thumbnail((side, side), Image.LANCZOS)
+        frame.info = {}
+        frames.append(frame)
+    buffer = BytesIO()
+    frames[0].save(
+        buffer, image.format, save_all=True, append_images=frames[1:],
+        duration=durations, loop=image.info.get('loop', 0),
+    )
+    return buffer.getvalue(), frames[0]
+
+
+def placeholder(image):
+    """Крошечное превью с пропорциями миниатюр в виде data URI."""
+    preview = ImageOps.fit(
+        image.convert('RGB'), settings.IMAGE_PLACEHOLDER_SIZE, Image.BILINEAR
+    )
+    buffer = BytesIO()
+    preview.save(buffer, 'WEBP', quality=40)
+    return 'data:image/webp;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def describe(name):
+    """Размеры и превью уже сохранённой картинки.
+
+    Размеры берутся из заголовка с учётом поворота по EXIF, а для превью
+    JPEG декодируется в самом мелком масштабе.
+    """
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        width, height = image.size
+        if image.getexif().get(ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+        image.draft('RGB', tuple(
+            side * 4 for side in settings.IMAGE_PLACEHOLDER_SIZE
+        ))
+        return width, height, placeholder(ImageOps.exif_transpose(image))
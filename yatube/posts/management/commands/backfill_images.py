@@ -0,0 +1,60 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.cache import bump
+from posts.images import describe
+from posts.models import Post
+
+FIELDS = ('image_width', 'image_height', 'image_placeholder')
+
+
+def measure(name):
+    try:
+        return describe(name)
+    except (OSError, SyntaxError, ValueError) as error:
+        return error
+
+
+class Command(BaseCommand):
+    help = 'Заполняет размеры и превью картинок у старых постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Число процессов, по умолчанию по числу ядер'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов обновлять одним запросом'
+        )
+
+    def handle(self, *args, **options):
+        rows = list(Post.objects.exclude(image='').filter(
+            Q(image_width=None) | Q(image_placeholder='')
+        ).values_list('pk', 'image'))
+        pool = ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=multiprocessing.get_context('fork'),
+        )
+        batch = []
+        filled = 0
+        with pool:
+            results = pool.map(
+                measure, (image for _, image in rows), chunksize=16
+            )
+            for (pk, image), result in zip(rows, results):
+                if isinstance(result, Exception):
+                    self.stderr.write(f'Пост {pk}, {image}: {result}')
+                    continue
+                batch.append(Post(pk=pk, **dict(zip(FIELDS, result))))
+                if len(batch) >= options['batch_size']:
+                    Post.objects.bulk_update(batch, FIELDS)
+                    filled += len(batch)
+                    batch = []
+        Post.objects.bulk_update(batch, FIELDS)
+        filled += len(batch)
+        bump('posts', 'groups')
+        self.stdout.write(f'Заполнено постов: {filled}')
@@ -0,0 +1,61 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Post, User
+from posts.timeline import FeedPaginator
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ленту подписок через FeedPaginator '
+        'с прежним join по author__following__user'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--pages', type=int, default=5,
+            help='Сколько страниц пролистать за один проход'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз повторить проход'
+        )
+
+    def join_pass(self, user, pages):
+        posts = Post.objects.select_related('author', 'group').filter(
+            author__following__user=user
+        )
+        for number in range(pages):
+            start = number * settings.PAGE_NUMBER
+            list(posts[start:start + settings.PAGE_NUMBER])
+
+    def feed_pass(self, user, pages):
+        paginator = FeedPaginator(user, settings.PAGE_NUMBER)
+        page = paginator.get_page()
+        for _ in range(pages - 1):
+            if not page.next_cursor:
+                break
+            page = paginator.get_page(page.next_cursor)
+
+    def measure(self, func, user, options):
+        started = perf_counter()
+        for _ in range(options['repeat']):
+            func(user, options['pages'])
+        return (perf_counter() - started) / options['repeat'] * 1000
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["username"]}')
+        join_ms = self.measure(self.join_pass, user, options)
+        feed_ms = self.measure(self.feed_pass, user, options)
+        self.stdout.write(
+            f'Подписок: {user.follower.count()}, '
+            f'страниц за проход: {options["pages"]}'
+        )
+        self.stdout.write(f'join:           {join_ms:8.2f} мс/проход')
+        self.stdout.write(f'FeedPaginator:  {feed_ms:8.2f} мс/проход')
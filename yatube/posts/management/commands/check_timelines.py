@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import timeline
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Сверяет материализованные ленты с подписками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='Пересобрать ленты, в которых найдены расхождения'
+        )
+
+    def handle(self, *args, **options):
+        broken = 0
+        users = User.objects.order_by('pk').values_list('pk', 'username')
+        for user_id, username in users.iterator():
+            missing, extra = timeline.diff(user_id)
+            if not missing and not extra:
+                continue
+            broken += 1
+            self.stdout.write(
+                f'{username}: не хватает {len(missing)}, лишних {len(extra)}'
+            )
+            if options['repair']:
+                timeline.rebuild(user_id)
+        if broken and not options['repair']:
+            raise CommandError(f'Лент с расхождениями: {broken}')
+        self.stdout.write(f'Лент с расхождениями: {broken}')
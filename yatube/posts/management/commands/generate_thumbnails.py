@@ -0,0 +1,44 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Нарезает миниатюры для постов, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Дорезать недостающие размеры и форматы у всех постов'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(
+                Q(thumbnails_ready=False) | Q(thumbnail_files='')
+            )
+        tasks = list(posts.values_list('pk', 'image'))
+        if settings.THUMBNAIL_WORKERS:
+            pool = thumbnails.executor()
+            results = [
+                pool.submit(thumbnails.render_in_pool, image).result
+                for _, image in tasks
+            ]
+        else:
+            results = [partial(thumbnails.render, image) for _, image in tasks]
+        done = 0
+        for (pk, image), result in zip(tasks, results):
+            try:
+                files = result()
+            except Exception as error:
+                self.stderr.write(f'Пост {pk}: {error}')
+                continue
+            thumbnails.record(pk, image, files)
+            done += 1
+        self.stdout.write(f'Нарезаны миниатюры для {done} постов')
@@ -0,0 +1,322 @@
+import csv
+import json
+import os
+import sys
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump
+from posts import counters, timeline
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+MODELS = ('user', 'group', 'post', 'comment', 'follow')
+
+LOOKUP_SIZE = 500
+
+
+def insert_ignore(model, objs):
+    """Вставляет объекты как есть, пропуская конфликты по ключам.
+
+    bulk_create записал бы в поля auto_now_add текущее время вместо
+    дат из файла, а выключать auto_now_add нельзя: поле общее для всех
+    потоков процесса. Значения берутся через pre_save(add=False);
+    сигналы post_save не шлются, их работу делает finalize.
+    """
+    if not objs:
+        return
+    fields = model._meta.concrete_fields
+    quote = connection.ops.quote_name
+    sql = (
+        f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+        f'{quote(model._meta.db_table)} '
+        f'({", ".join(quote(field.column) for field in fields)}) '
+        f'VALUES ({", ".join(["%s"] * len(fields))}) '
+        f'{connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [
+                field.get_db_prep_save(field.pre_save(obj, False), connection)
+                for field in fields
+            ]
+            for obj in objs
+        ])
+
+
+def batches(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), LOOKUP_SIZE):
+        yield ids[start:start + LOOKUP_SIZE]
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'Неверная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def read_records(path, file_format, model):
+    """Записи файла по одной, без чтения файла целиком."""
+    file = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    with file:
+        if file_format == 'csv':
+            for row in csv.DictReader(file):
+                row.setdefault('model', model)
+                yield row
+            return
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы, посты, комментарии и подписки '
+        'из JSONL или CSV порциями через bulk_create'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат файла, по умолчанию по расширению'
+        )
+        parser.add_argument(
+            '--model', choices=MODELS,
+            help='Модель для строк CSV без колонки model'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько записей вставлять в одной транзакции'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл, где запоминается число загруженных записей'
+        )
+        parser.add_argument(
+            '--skip-finalize', action='store_true',
+            help=(
+                'Не пересчитывать счётчики и ленты после загрузки: '
+                'тогда нужны recount и backfill_timelines'
+            )
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        if file_format == 'csv' and not options['model']:
+            raise CommandError('Для CSV нужен --model')
+        self.users = {}
+        self.groups = {}
+        self.skipped = 0
+        self.affected = {
+            'users': set(), 'groups': set(), 'posts': set(),
+            'readers': set(), 'authors': set(),
+        }
+        done = self.load_checkpoint(options['checkpoint'], path)
+        records = islice(
+            read_records(path, file_format, options['model']), done, None
+        )
+        batch_size = options['batch_size']
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                self.insert(batch, done)
+            done += len(batch)
+            self.save_checkpoint(options['checkpoint'], path, done)
+            self.stdout.write(f'Загружено записей: {done}')
+        if self.skipped:
+            self.stderr.write(f'Пропущено записей: {self.skipped}')
+        if not options['skip_finalize']:
+            self.finalize()
+
+    def load_checkpoint(self, checkpoint, path):
+        if not checkpoint or not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as file:
+            return json.load(file).get(os.path.abspath(path), 0)
+
+    def save_checkpoint(self, checkpoint, path, done):
+        if not checkpoint:
+            return
+        state = {}
+        if os.path.exists(checkpoint):
+            with open(checkpoint) as file:
+                state = json.load(file)
+        state[os.path.abspath(path)] = done
+        with open(f'{checkpoint}.tmp', 'w') as file:
+            json.dump(state, file)
+        os.replace(f'{checkpoint}.tmp', checkpoint)
+
+    def resolve(self, known, queryset, field, names):
+        """Дополняет карту name -> pk тем, чего в ней ещё нет."""
+        missing = sorted({name for name in names if name} - set(known))
+        for start in range(0, len(missing), LOOKUP_SIZE):
+            known.update(queryset.filter(**{
+                f'{field}__in': missing[start:start + LOOKUP_SIZE]
+            }).values_list(field, 'pk'))
+
+    def skip(self, number, record, reason):
+        self.skipped += 1
+        self.stderr.write(f'Запись {number}: {reason}: {record}')
+
+    def insert(self, batch, offset):
+        by_model = {model: [] for model in MODELS}
+        for number, record in enumerate(batch, offset + 1):
+            model = record.get('model')
+            if model not in by_model:
+                self.skip(number, record, 'неизвестная модель')
+                continue
+            by_model[model].append((number, record))
+        users = [
+            User(
+                username=record['username'],
+                first_name=record.get('first_name') or '',
+                last_name=record.get('last_name') or '',
+                email=record.get('email') or '',
+                password=record.get('password') or make_password(None),
+            )
+            for _, record in by_model['user'] if record.get('username')
+        ]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        names = [user.username for user in users]
+        self.resolve(self.users, User.objects, 'username', names)
+        UserStats.objects.bulk_create([
+            UserStats(user_id=self.users[name]) for name in names
+        ], ignore_conflicts=True)
+        Group.objects.bulk_create([
+            Group(
+                slug=record['slug'],
+                title=record['title'],
+                description=record.get('description') or '',
+            )
+            for _, record in by_model['group']
+            if record.get('slug') and record.get('title')
+        ], ignore_conflicts=True)
+        self.resolve(self.users, User.objects, 'username', (
+            record.get(field)
+            for model, fields in (
+                ('post', ('author',)),
+                ('comment', ('author',)),
+                ('follow', ('user', 'author')),
+            )
+            for _, record in by_model[model]
+            for field in fields
+        ))
+        self.resolve(self.groups, Group.objects, 'slug', (
+            record.get('group') for _, record in by_model['post']
+        ))
+        self._insert_posts(by_model['post'])
+        self._insert_comments(by_model['comment'])
+        self._insert_follows(by_model['follow'])
+
+    def _insert_posts(self, records):
+        posts = []
+        for number, record in records:
+            if record.get('author') not in self.users:
+                self.skip(number, record, 'нет автора')
+            elif record.get('group') and record['group'] not in self.groups:
+                self.skip(number, record, 'нет группы')
+            else:
+                try:
+                    posts.append(Post(
+                        id=record.get('id') or None,
+                        author_id=self.users[record['author']],
+                        group_id=self.groups.get(record.get('group')),
+                        text=record['text'],
+                        pub_date=parse_date(record.get('pub_date')),
+                        image=record.get('image') or '',
+                    ))
+                except (KeyError, ValueError) as error:
+                    self.skip(number, record, repr(error))
+        insert_ignore(Post, posts)
+        for post in posts:
+            self.affected['users'].add(post.author_id)
+            self.affected['authors'].add(post.author_id)
+            if post.group_id:
+                self.affected['groups'].add(post.group_id)
+
+    def _insert_comments(self, records):
+        for _, record in records:
+            if str(record.get('post', '')).isdigit():
+                record['post'] = int(record['post'])
+        post_ids = set(Post.objects.filter(pk__in={
+            record['post'] for _, record in records
+            if isinstance(record.get('post'), int)
+        }).values_list('pk', flat=True))
+        comments = []
+        for number, record in records:
+            if record.get('author') not in self.users:
+                self.skip(number, record, 'нет автора')
+            elif record.get('post') not in post_ids:
+                self.skip(number, record, 'нет поста')
+            else:
+                try:
+                    comments.append(Comment(
+                        id=record.get('id') or None,
+                        post_id=record['post'],
+                        author_id=self.users[record['author']],
+                        text=record['text'],
+                        created=parse_date(record.get('created')),
+                    ))
+                except (KeyError, ValueError) as error:
+                    self.skip(number, record, repr(error))
+        insert_ignore(Comment, comments)
+        self.affected['posts'].update(comment.post_id for comment in comments)
+
+    def _insert_follows(self, records):
+        follows = []
+        for number, record in records:
+            if not {record.get('user'), record.get('author')} <= set(
+                self.users
+            ):
+                self.skip(number, record, 'нет пользователя')
+            elif record['user'] == record['author']:
+                self.skip(number, record, 'подписка на себя')
+            else:
+                follows.append(Follow(
+                    user_id=self.users[record['user']],
+                    author_id=self.users[record['author']],
+                ))
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        for follow in follows:
+            self.affected['users'].update((follow.user_id, follow.author_id))
+            self.affected['readers'].add(follow.user_id)
+
+    def finalize(self):
+        """Сигналов при вставке нет: счётчики, ленты и кеш доводятся
+        только для затронутых импортом id.
+        """
+        affected = self.affected
+        for kind, recount in (
+            ('users', counters.recount_users),
+            ('groups', counters.recount_groups),
+            ('posts', counters.recount_posts),
+        ):
+            for ids in batches(affected[kind]):
+                with transaction.atomic():
+                    recount(ids)
+        for author_id in affected['users']:
+            timeline.followers_changed(author_id)
+        for user_id in sorted(affected['readers']):
+            timeline.rebuild(user_id)
+        for ids in batches(affected['authors']):
+            for author_id in ids:
+                if not timeline.is_heavy(author_id):
+                    timeline.spread_author(author_id)
+            timeline.forget_author_timeline(*ids)
+        bump('posts', 'groups')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит авторов между раскладкой постов по лентам '
+        'и слиянием при чтении'
+    )
+
+    def handle(self, *args, **options):
+        merged, spread = timeline.rebalance()
+        self.stdout.write(
+            f'Переведено на слияние: {merged}, разложено по лентам: {spread}'
+        )
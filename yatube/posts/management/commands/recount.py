@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import RECOUNTERS, chunks
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько записей пересчитывать в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        for manager, recount in RECOUNTERS:
+            fixed = 0
+            for ids in chunks(manager.all(), options['chunk_size']):
+                with transaction.atomic():
+                    fixed += recount(ids)
+            self.stdout.write(
+                f'{manager.model._meta.verbose_name_plural}: '
+                f'исправлено {fixed}'
+            )
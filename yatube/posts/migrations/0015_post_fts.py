@@ -0,0 +1,22 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:10
+
+from django.db import migrations
+
+from posts.fts import CREATE_TABLE, REBUILD, TABLE, TRIGGERS
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [CREATE_TABLE, *TRIGGERS.values(), REBUILD],
+            [
+                *(f'DROP TRIGGER IF EXISTS {name}' for name in reversed(TRIGGERS)),
+                f'DROP TABLE {TABLE}',
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_merged(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gte=settings.FANOUT_FOLLOWER_THRESHOLD
+    ).update(timeline_merged=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='timeline_merged',
+            field=models.BooleanField(default=False, help_text='Посты автора не раскладываются по лентам подписчиков', verbose_name='Лента сливается при чтении'),
+        ),
+        migrations.RunPython(mark_merged, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_userstats_timeline_merged'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail_files',
+            field=models.TextField(blank=True, editable=False, help_text='JSON: формат, имя файла, ширина и высота каждой миниатюры', verbose_name='Файлы миниатюр'),
+        ),
+    ]
@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.cache import bump
+from . import counters, timeline
+from .models import (
+    Comment, Follow, Group, Post, PostEvent, TimelineEntry, User
+)
+
+
+def batches(ids):
+    ids = sorted(set(ids))
+    size = settings.MODERATION_BATCH_SIZE
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _delete(queryset):
+    """DELETE одним запросом по строкам queryset, без их выборки.
+
+    В отличие от queryset.delete() не шлются pre_delete и post_delete:
+    post_deleted, comment_deleted и follow_deleted не сдвигают счётчики
+    и не сбрасывают кеш, а ON DELETE CASCADE не выполняется. Зависимые
+    строки, счётчики и кеш вызывающий код чистит сам. Возвращает число
+    удалённых строк.
+    """
+    meta = queryset.model._meta
+    select, params = queryset.order_by().values('pk').query.sql_with_params()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(meta.db_table)} '
+            f'WHERE {quote(meta.pk.column)} IN ({select})',
+            params
+        )
+        return cursor.rowcount
+
+
+def _bump(post_ids=(), author_ids=(), group_ids=()):
+    usernames = [
+        username for batch in batches(author_ids)
+        for username in User.objects.filter(
+            pk__in=batch
+        ).values_list('username', flat=True)
+    ]
+    slugs = Group.objects.filter(
+        pk__in={group_id for group_id in group_ids if group_id}
+    ).values_list('slug', flat=True)
+    bump(
+        'posts',
+        *(f'post:{post_id}' for post_id in post_ids),
+        *(f'author:{username}' for username in usernames),
+        *(f'group:{slug}' for slug in slugs)
+    )
+
+
+def move_posts(post_ids, group_id):
+    """Переносит посты в группу или, при group_id=None, убирает из групп.
+
+    Возвращает число перенесённых постов.
+    """
+    moved = 0
+    group_ids = {group_id}
+    author_ids = set()
+    with transaction.atomic():
+        for batch in batches(post_ids):
+            posts = Post.objects.filter(pk__in=batch)
+            for author_id, old_group_id in posts.values_list(
+                'author_id', 'group_id'
+            ).distinct():
+                author_ids.add(author_id)
+                group_ids.add(old_group_id)
+            moved += posts.update(group_id=group_id)
+        counters.recount_groups(
+            [group_id for group_id in group_ids if group_id]
+        )
+    _bump(post_ids, author_ids, group_ids)
+    return moved
+
+
+def delete_authors_content(author_ids):
+    """Удаляет все посты и комментарии авторов.
+
+    Возвращает (число постов, число комментариев).
+    """
+    posts_deleted = comments_deleted = 0
+    author_ids = set(author_ids)
+    post_ids = set()
+    group_ids = set()
+    commented = set()
+    with transaction.atomic():
+        for batch in batches(author_ids):
+            posts = Post.objects.filter(author_id__in=batch)
+            for post_id, group_id in posts.values_list('pk', 'group_id'):
+                post_ids.add(post_id)
+                group_ids.add(group_id)
+            comments = Comment.objects.filter(author_id__in=batch)
+            commented.update(
+                comments.values_list('post_id', flat=True).distinct()
+            )
+            comments_deleted += _delete(comments)
+        for batch in batches(post_ids):
+            comments_deleted += _delete(
+                Comment.objects.filter(post_id__in=batch)
+            )
+            _delete(TimelineEntry.objects.filter(post_id__in=batch))
+            _delete(PostEvent.objects.filter(post_id__in=batch))
+            posts_deleted += _delete(Post.objects.filter(pk__in=batch))
+        for batch in batches(author_ids):
+            counters.recount_users(batch)
+        counters.recount_groups(
+            [group_id for group_id in group_ids if group_id]
+        )
+        for batch in batches(commented - post_ids):
+            counters.recount_posts(batch)
+    timeline.forget_author_timeline(*author_ids)
+    _bump(post_ids | commented, author_ids, group_ids)
+    return posts_deleted, comments_deleted
+
+
+def purge_follows(user_ids):
+    """Удаляет подписки пользователей и подписки на них.
+
+    Возвращает число удалённых подписок.
+    """
+    deleted = 0
+    user_ids = set(user_ids)
+    affected = set(user_ids)
+    with transaction.atomic():
+        for batch in batches(user_ids):
+            follows = Follow.objects.filter(
+                Q(user_id__in=batch) | Q(author_id__in=batch)
+            )
+            for user_id, author_id in follows.values_list(
+                'user_id', 'author_id'
+            ):
+                affected.update((user_id, author_id))
+            _delete(TimelineEntry.objects.filter(user_id__in=batch))
+            _delete(TimelineEntry.objects.filter(
+                post_id__in=Post.objects.filter(
+                    author_id__in=batch
+                ).values('pk')
+            ))
+            deleted += _delete(follows)
+        for batch in batches(affected):
+            counters.recount_users(batch)
+    _bump(author_ids=affected)
+    return deleted
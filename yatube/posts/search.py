@@ -0,0 +1,81 @@
+import re
+
+from django.db import connection
+
+from .fts import TABLE
+from .models import Post
+from .utils import CursorPaginator
+
+
+def match_query(query):
+    """Запрос FTS5 из пользовательского ввода.
+
+    Слова берутся в кавычки, чтобы операторы FTS5 не разбирались,
+    последнее ищется по префиксу.
+    """
+    terms = [f'"{word}"' for word in re.findall(r'\w+', query)]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def filter_posts(queryset, query):
+    """Оставляет в queryset только посты, найденные по индексу.
+
+    pk__in с RawSQL Django оборачивает в двойные скобки, и SQLite
+    читает такой подзапрос как одно значение, поэтому условие
+    пишется через extra.
+    """
+    return queryset.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN '
+            f'(SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)'
+        ],
+        params=[match_query(query)]
+    )
+
+
+def ranked(match, values, reverse, limit):
+    """Пары (rank, id) совпадений в порядке релевантности после ключа."""
+    sql = f'SELECT rank, rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+    params = [match]
+    lookup, direction = ('<', 'DESC') if reverse else ('>', 'ASC')
+    if values is not None:
+        sql += f' AND (rank {lookup} %s OR (rank = %s AND rowid {lookup} %s))'
+        params += [values[0], values[0], values[1]]
+    sql += f' ORDER BY rank {direction}, rowid {direction} LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+class SearchPaginator(CursorPaginator):
+    """Результаты поиска по релевантности bm25 с пагинацией по ключу."""
+
+    def __init__(self, query, per_page):
+        match = match_query(query)
+        posts = Post.objects.none()
+        if match:
+            posts = filter_posts(Post.objects.all(), query)
+        super().__init__(posts, per_page, ('rank', 'id'))
+        self.match = match
+
+    def parse_value(self, field, value):
+        if field == 'rank':
+            return float(value)
+        return super().parse_value(field, value)
+
+    def fetch(self, values, reverse, limit):
+        if not self.match:
+            return []
+        keys = ranked(self.match, values, reverse, limit)
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [post_id for _, post_id in keys]
+        )
+        found = []
+        for rank, post_id in keys:
+            if post_id in posts:
+                posts[post_id].rank = rank
+                found.append(posts[post_id])
+        return found
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump
+from . import counters, events, timeline
+from .models import Comment, Follow, Group, Post, UserStats
+
+
+def bump_post(post, *group_ids):
+    group_ids = {group_id for group_id in group_ids if group_id}
+    slugs = []
+    if post.group_id in group_ids and Post.group.is_cached(post):
+        slugs.append(post.group.slug)
+        group_ids.discard(post.group_id)
+    if group_ids:
+        slugs += Group.objects.filter(
+            pk__in=group_ids
+        ).values_list('slug', flat=True)
+    bump(
+        'posts',
+        f'post:{post.pk}',
+        f'author:{post.author.username}',
+        *(f'group:{slug}' for slug in slugs)
+    )
+
+
+def bump_follow(follow):
+    bump(
+        f'author:{follow.user.username}',
+        f'author:{follow.author.username}'
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    """Группа поста в базе: запомнена при загрузке или читается здесь."""
+    if not hasattr(instance, '_saved_group_id'):
+        instance._saved_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.shift_user(instance.author_id, posts_count=1)
+        counters.shift_group(instance.group_id, 1)
+        timeline.fan_out_post(instance)
+        events.publish(instance)
+    elif instance._saved_group_id != instance.group_id:
+        counters.shift_group(instance._saved_group_id, -1)
+        counters.shift_group(instance.group_id, 1)
+    bump_post(instance, instance.group_id, instance._saved_group_id)
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.shift_user(instance.author_id, posts_count=-1)
+    counters.shift_group(instance.group_id, -1)
+    timeline.forget_author_timeline(instance.author_id)
+    bump_post(instance, instance.group_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump('groups', f'group:{instance.slug}')
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.shift_post(instance.post_id, 1)
+    bump(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.shift_post(instance.post_id, -1)
+    bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.shift_user(instance.user_id, following_count=1)
+        counters.shift_user(instance.author_id, followers_count=1)
+        timeline.add_author(instance.user_id, instance.author_id)
+        timeline.followers_changed(instance.author_id)
+        bump_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.shift_user(instance.user_id, following_count=-1)
+    counters.shift_user(instance.author_id, followers_count=-1)
+    timeline.remove_author(instance.user_id, instance.author_id)
+    bump_follow(instance)
@@ -1,5 +1,6 @@
 import tempfile
 import shutil
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -8,15 +9,23 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from http import HTTPStatus
+from PIL import Image
+from PIL.ExifTags import TAGS
+
+from ..forms import PostForm
 
 from ..models import Comment, Group, Post, User
 
 User = get_user_model()
 
+EXIF_TAGS = {name: tag for tag, name in TAGS.items()}
+ORIENTATION = EXIF_TAGS['Orientation']
+MAKE = EXIF_TAGS['Make']
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class CreatinoFormTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -116,7 +125,7 @@ class CreatinoFormTest(TestCase):
         )
         self.assertEqual(group_response.status_code, HTTPStatus.OK)
         self.assertEqual(
-            group_response.context['page_obj'].object_list.count(),
+            len(group_response.context['page_obj'].object_list),
             0
         )
         self.assertEqual(Post.objects.count(), post_count)
@@ -164,3 +173,84 @@ class CreatinoFormTest(TestCase):
         self.assertEqual(comment.post, self.post)
         self.assertEqual(comment.author, self.another_user)
         self.assertEqual(comment.text, form_data['text'])
+
+    @override_settings(IMAGE_MAX_SIDE=100)
+    def test_image_normalized_on_upload(self):
+        """Картинка поворачивается по EXIF, ужимается и теряет метаданные"""
+        image = Image.new('RGB', (300, 150), 'red')
+        exif = image.getexif()
+        exif[ORIENTATION] = 6
+        exif[MAKE] = 'Test camera'
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes())
+        uploaded = SimpleUploadedFile(
+            name='photo.jpg',
+            content=buffer.getvalue(),
+            content_type='image/jpeg'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Text form', 'image': uploaded}
+        )
+        post = Post.objects.first()
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/webp;base64,')
+        )
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (50, 100))
+            self.assertNotIn('exif', stored.info)
+
+    def animation(self):
+        frames = [
+            Image.new('RGB', (300, 150), color)
+            for color in ('red', 'green', 'blue')
+        ]
+        buffer = BytesIO()
+        frames[0].save(
+            buffer, 'GIF', save_all=True, append_images=frames[1:],
+            duration=40, loop=0, comment=b'Test camera'
+        )
+        return SimpleUploadedFile(
+            name='animation.gif',
+            content=buffer.getvalue(),
+            content_type='image/gif'
+        )
+
+    @override_settings(IMAGE_MAX_SIDE=100)
+    def test_animation_normalized_by_frame(self):
+        """Анимация ужимается кадр за кадром и теряет метаданные"""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Text form', 'image': self.animation()}
+        )
+        post = Post.objects.first()
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual((stored.size, stored.n_frames), ((100, 50), 3))
+            self.assertNotIn('comment', stored.info)
+
+    @override_settings(IMAGE_MAX_ANIMATION_PIXELS=100000)
+    def test_huge_animation_rejected(self):
+        """Анимация с лишними пикселями во всех кадрах отклоняется"""
+        form = PostForm(
+            data={'text': 'Text form'}, files={'image': self.animation()}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_huge_image_rejected(self):
+        """Картинка с лишними пикселями отклоняется до распаковки"""
+        buffer = BytesIO()
+        Image.new('RGB', (20, 20), 'red').save(buffer, 'PNG')
+        form = PostForm(
+            data={'text': 'Text form'},
+            files={'image': SimpleUploadedFile(
+                name='huge.png',
+                content=buffer.getvalue(),
+                content_type='image/png'
+            )}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
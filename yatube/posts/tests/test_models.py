@@ -1,11 +1,27 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from PIL import Image
 
-from ..models import Group, Post
+from .. import moderation
+from ..counters import RECOUNTERS
+from ..images import ORIENTATION
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+from ..timeline import FeedPaginator, diff, is_heavy
 
 User = get_user_model()
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -55,3 +71,388 @@ class PostModelTest(TestCase):
                 self.assertEqual(
                     self.post._meta.get_field(field).help_text, ht
                 )
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        cache.clear()
+
+    def timeline_posts(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.reader
+        ).values_list('post_id', flat=True))
+
+    def test_follow_fills_and_unfollow_clears_timeline(self):
+        """Подписка заполняет ленту, отписка очищает"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.timeline_posts(), [self.old_post.pk])
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(
+            self.timeline_posts(), [new_post.pk, self.old_post.pk]
+        )
+        follow.delete()
+        self.assertEqual(self.timeline_posts(), [])
+
+    @override_settings(TIMELINE_FOLLOW_POSTS=1)
+    def test_follow_copies_recent_posts_only(self):
+        """Подписка копирует в ленту только последние посты автора"""
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.timeline_posts(), [new_post.pk])
+        self.assertEqual(diff(self.reader.pk), (set(), set()))
+
+    def test_check_timelines_repairs_drift(self):
+        """check_timelines находит и чинит расхождения"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.filter(user=self.reader).delete()
+        with self.assertRaises(CommandError):
+            call_command('check_timelines', stdout=StringIO())
+        call_command('check_timelines', repair=True, stdout=StringIO())
+        self.assertEqual(self.timeline_posts(), [self.old_post.pk])
+
+    @override_settings(FANOUT_FOLLOWER_THRESHOLD=2)
+    def test_heavy_author_merged_on_read(self):
+        """Посты популярного автора подмешиваются при чтении"""
+        star = User.objects.create_user(username='star')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=star)
+        Follow.objects.create(user=self.reader, author=star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = []
+        for number in range(3):
+            posts.append(Post.objects.create(author=star, text=f'{number}'))
+            posts.append(
+                Post.objects.create(author=self.author, text=f'{number}')
+            )
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=star).exists()
+        )
+        expected = sorted(
+            posts + [self.old_post],
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=True
+        )
+        paginator = FeedPaginator(self.reader, 4)
+        first_page = paginator.get_page()
+        second_page = paginator.get_page(first_page.next_cursor)
+        self.assertEqual(list(first_page) + list(second_page), expected)
+        previous_page = paginator.get_page(second_page.previous_cursor)
+        self.assertEqual(list(previous_page), expected[:4])
+
+    @override_settings(FANOUT_FOLLOWER_THRESHOLD=2, FANOUT_DEMOTE_THRESHOLD=2)
+    def test_author_crossing_threshold_keeps_feed(self):
+        """Порог подписчиков переключает только отметку, ленты переносит
+        rebalance_timelines
+        """
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=fan, author=self.author)
+        self.assertTrue(is_heavy(self.author.pk))
+        post = Post.objects.create(author=self.author, text='Популярный')
+        follow.delete()
+        Follow.objects.create(user=fan, author=self.author).delete()
+        self.assertTrue(is_heavy(self.author.pk))
+        self.assertEqual(self.timeline_posts(), [self.old_post.pk])
+        page = FeedPaginator(self.reader, 10).get_page()
+        self.assertEqual(list(page), [post, self.old_post])
+        call_command('rebalance_timelines', stdout=StringIO())
+        self.assertFalse(is_heavy(self.author.pk))
+        self.assertEqual(
+            self.timeline_posts(), [post.pk, self.old_post.pk]
+        )
+        self.assertEqual(diff(self.reader.pk), (set(), set()))
+        page = FeedPaginator(self.reader, 10).get_page()
+        self.assertEqual(list(page), [post, self.old_post])
+
+    @override_settings(FANOUT_FOLLOWER_THRESHOLD=2, FANOUT_DEMOTE_THRESHOLD=1)
+    def test_rebalance_clears_merged_author_entries(self):
+        """rebalance_timelines убирает записи автора со слиянием"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        self.assertEqual(self.timeline_posts(), [self.old_post.pk])
+        call_command('rebalance_timelines', stdout=StringIO())
+        self.assertTrue(is_heavy(self.author.pk))
+        self.assertEqual(self.timeline_posts(), [])
+        page = FeedPaginator(self.reader, 10).get_page()
+        self.assertEqual(list(page), [self.old_post])
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа', slug='other', description='Описание'
+        )
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счётчики следуют за постами, комментариями и подписками"""
+        post = Post.objects.create(
+            author=self.author, text='Текст', group=self.group
+        )
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.other_group.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_drifted_counters_do_not_go_negative(self):
+        """Удаление при обнулённых счётчиках не уводит их ниже нуля"""
+        post = Post.objects.create(
+            author=self.author, text='Текст', group=self.group
+        )
+        UserStats.objects.filter(user=self.author).update(posts_count=0)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """recount исправляет разошедшиеся счётчики"""
+        Post.objects.create(author=self.author, text='Текст', group=self.group)
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        UserStats.objects.filter(user=self.reader).delete()
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        call_command('recount', chunk_size=1, stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.assertEqual(self.group.posts_count, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageBackfillTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_backfill_images(self):
+        """backfill_images заполняет размеры и превью старых постов"""
+        image = Image.new('RGB', (300, 150), 'red')
+        exif = image.getexif()
+        exif[ORIENTATION] = 6
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes())
+        post = Post.objects.create(
+            author=User.objects.create_user(username='author'),
+            text='Текст',
+            image=SimpleUploadedFile(
+                name='old.jpg',
+                content=buffer.getvalue(),
+                content_type='image/jpeg'
+            )
+        )
+        call_command('backfill_images', workers=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (150, 300))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/webp;base64,')
+        )
+
+
+class ModerationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.spammer = User.objects.create_user(username='spammer')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа', slug='other', description='Описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        Follow.objects.create(user=self.reader, author=self.spammer)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.spammer, author=self.author)
+        self.spam = [
+            Post.objects.create(
+                author=self.spammer, text='Спам', group=self.group
+            )
+            for _ in range(3)
+        ]
+        self.post = Post.objects.create(
+            author=self.author, text='Текст', group=self.group
+        )
+        Comment.objects.create(
+            post=self.post, author=self.spammer, text='Спам'
+        )
+        Comment.objects.create(
+            post=self.spam[0], author=self.reader, text='Ответ'
+        )
+
+    def assertConsistent(self):
+        for manager, recount in RECOUNTERS:
+            self.assertEqual(
+                recount(list(manager.values_list('pk', flat=True))), 0,
+                manager.model.__name__
+            )
+        for user in (self.spammer, self.author, self.reader):
+            self.assertEqual(diff(user.pk), (set(), set()))
+
+    def test_move_and_detach(self):
+        """Перенос и отвязка постов одним запросом держат счётчики групп"""
+        ids = [post.pk for post in self.spam]
+        self.assertEqual(
+            moderation.move_posts(ids[:2], self.other_group.pk), 2
+        )
+        self.assertEqual(moderation.move_posts(ids, None), 3)
+        self.assertEqual(Post.objects.filter(group=None).count(), 3)
+        self.assertConsistent()
+
+    def test_delete_authors_content(self):
+        """Удаление контента спамера чистит посты, комментарии и ленты"""
+        posts, comments = moderation.delete_authors_content([self.spammer.pk])
+        self.assertEqual((posts, comments), (3, 2))
+        self.assertFalse(Post.objects.filter(author=self.spammer).exists())
+        self.assertEqual(Comment.objects.count(), 0)
+        self.assertConsistent()
+
+    def test_purge_follows(self):
+        """Чистка подписок убирает их вместе с записями лент"""
+        self.assertEqual(moderation.purge_follows([self.spammer.pk]), 2)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertConsistent()
+
+
+class ImportDataTest(TestCase):
+    RECORDS = [
+        {'model': 'user', 'username': 'leo', 'first_name': 'Лев'},
+        {'model': 'user', 'username': 'reader'},
+        {'model': 'group', 'slug': 'prose', 'title': 'Проза'},
+        {
+            'model': 'post', 'id': 100, 'author': 'leo', 'group': 'prose',
+            'text': 'Война и мир', 'pub_date': '1869-01-01T12:00:00',
+        },
+        {'model': 'post', 'id': 101, 'author': 'leo', 'text': 'Анна'},
+        {'model': 'post', 'author': 'ghost', 'text': 'Нет автора'},
+        {'model': 'follow', 'user': 'reader', 'author': 'leo'},
+        {
+            'model': 'comment', 'post': 100, 'author': 'reader',
+            'text': 'Длинно', 'created': '1870-06-01T12:00:00',
+        },
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def run_import(self, *args):
+        stderr = StringIO()
+        call_command(
+            'import_data', *args, '--batch-size', '3',
+            stdout=StringIO(), stderr=stderr
+        )
+        return stderr.getvalue()
+
+    def test_import_jsonl(self):
+        """Импорт раскладывает записи, связи и счётчики без сигналов"""
+        path = self.write('data.jsonl', '\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in self.RECORDS
+        ))
+        errors = self.run_import(path)
+        self.assertIn('нет автора', errors)
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.pub_date.year, 1869)
+        self.assertEqual(post.group.slug, 'prose')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.comments.get().created.year, 1870)
+        leo = User.objects.get(username='leo')
+        reader = User.objects.get(username='reader')
+        self.assertFalse(leo.has_usable_password())
+        self.assertEqual(leo.stats.posts_count, 2)
+        self.assertEqual(leo.stats.followers_count, 1)
+        self.assertEqual(Group.objects.get().posts_count, 1)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=reader
+            ).values_list('post_id', flat=True)),
+            {100, 101}
+        )
+        self.run_import(path)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_finalize_touches_imported_only(self):
+        """Счётчики доводятся только для затронутых импортом записей"""
+        author = User.objects.create_user(username='leo')
+        other = User.objects.create_user(username='other')
+        UserStats.objects.filter(pk__in=(author.pk, other.pk)).update(
+            posts_count=5
+        )
+        path = self.write('data.jsonl', '\n'.join(map(json.dumps, (
+            {'model': 'user', 'username': 'silent'},
+            {'model': 'post', 'author': 'leo', 'text': 'Текст'},
+        ))))
+        self.run_import(path)
+        self.assertEqual(UserStats.objects.get(pk=author.pk).posts_count, 1)
+        self.assertEqual(UserStats.objects.get(pk=other.pk).posts_count, 5)
+        self.assertTrue(
+            UserStats.objects.filter(user__username='silent').exists()
+        )
+
+    def test_resume_from_checkpoint(self):
+        """С чекпоинтом повторный запуск продолжает с места остановки"""
+        path = self.write('posts.csv', 'author,text\nleo,Первый\nleo,Второй\n')
+        checkpoint = f'{self.directory}/checkpoint.json'
+        User.objects.create_user(username='leo')
+        with open(checkpoint, 'w') as file:
+            json.dump({path: 1}, file)
+        self.run_import(path, '--model', 'post', '--checkpoint', checkpoint)
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['Второй']
+        )
+        self.run_import(path, '--model', 'post', '--checkpoint', checkpoint)
+        self.assertEqual(Post.objects.count(), 1)
+        with self.assertRaises(CommandError):
+            call_command('import_data', path)
@@ -1,15 +1,36 @@
+import asyncio
+import base64
+import json
+import os
 import tempfile
 import shutil
+import time
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from django.core.cache import cache
+from django.core.cache import cache, caches
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django import forms
+from PIL import Image
+from sorl.thumbnail.base import ThumbnailBackend
 
-from ..models import Follow, Group, Post, User
+from core.asgi import Bridge
+
+from .. import asgi, thumbnails
+from ..models import Comment, Follow, Group, Post, PostEvent, User
 from ..forms import PostForm
 
 User = get_user_model()
@@ -17,7 +38,7 @@ User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostPagesTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -164,20 +185,36 @@ class PostPagesTest(TestCase):
                         self.assertIsInstance(form_field, expected)
 
     def test_index_cache_works(self):
+        """Фрагмент главной кешируется и сбрасывается при изменении постов"""
         new_post = Post.objects.create(
             text='text',
             author=self.user
         )
         response = self.authorized_client.get(reverse('posts:main_page'))
         content_before = response.content
+        Post.objects.filter(pk=new_post.pk).update(text='changed quietly')
+        response_2 = self.authorized_client.get(reverse('posts:main_page'))
+        self.assertEqual(content_before, response_2.content)
         new_post.delete()
-        response_2 = self.authorized_client.get(reverse('post:main_page'))
-        content_after_delete = response_2.content
-        self.assertEqual(content_before, content_after_delete)
-        cache.clear()
         response_3 = self.authorized_client.get(reverse('posts:main_page'))
-        content_after_clear = response_3.content
-        self.assertNotEqual(content_before, content_after_clear)
+        self.assertNotEqual(content_before, response_3.content)
+
+    def test_fragment_versions_follow_changes(self):
+        """Правка поста сразу видна в группе и профиле"""
+        urls = (
+            reverse('posts:group_posts_page', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        self.post.text = 'Edited text'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Edited text')
+        self.post.text = 'Test text'
+        self.post.save()
 
     def test_auth_user_can_follow(self):
         """Работают ли подписки"""
@@ -284,3 +321,901 @@ class PaginatorViewsTest(TestCase):
                         self.assertEqual(
                             len(response.context['page_obj']), posts
                         )
+
+    def test_cursor_pages(self):
+        """Переход по курсорам вперёд и назад без COUNT"""
+        url = reverse('posts:main_page')
+        response = self.authorized_client.get(url)
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), settings.PAGE_NUMBER)
+        self.assertFalse(first_page.previous_cursor)
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(
+                url, {'cursor': first_page.next_cursor}
+            )
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries)
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(
+            len(second_page), settings.POSTS_NUMBER - settings.PAGE_NUMBER
+        )
+        self.assertFalse(second_page.next_cursor)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(second_page.has_next())
+            self.assertTrue(second_page.has_other_pages())
+        self.assertEqual(len(queries), 0)
+        response = self.authorized_client.get(
+            url, {'cursor': second_page.previous_cursor}
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), list(first_page)
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор отдаёт первую страницу"""
+        response = self.authorized_client.get(
+            reverse('posts:main_page'), {'cursor': 'not-a-cursor'}
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), settings.PAGE_NUMBER
+        )
+
+    def test_null_cursor_returns_first_page(self):
+        """Курсор с пустым ключом отдаёт первую страницу"""
+        cursor = base64.urlsafe_b64encode(b'[null, null, 0]').decode()
+        response = self.authorized_client.get(
+            reverse('posts:main_page'), {'cursor': cursor}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.context['page_obj']), settings.PAGE_NUMBER
+        )
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='tester')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Test title',
+            slug='test',
+            description='Test description'
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, text='Test text', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def main_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return [
+            query['sql'] for query in queries
+            if 'ORDER BY' in query['sql'] and (
+                'FROM "posts_post"' in query['sql']
+                or 'FROM "posts_timelineentry"' in query['sql']
+            )
+        ]
+
+    def test_feed_queries_use_indexes(self):
+        """Основные запросы лент читаются по индексу без сортировки"""
+        urls = (
+            reverse('posts:main_page'),
+            reverse('posts:group_posts_page', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                queries = self.main_queries(url)
+                self.assertTrue(queries)
+                for sql in queries:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                        plan = ' '.join(row[-1] for row in cursor.fetchall())
+                    self.assertIn('INDEX', plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(COMMENTS_PAGE_NUMBER=3)
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='tester')
+        cls.post = Post.objects.create(author=cls.user, text='Test text')
+        for number in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Comment {number}'
+            )
+
+    def test_comments_split_into_pages(self):
+        """Первая страница комментариев в посте, остальные фрагментом"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        first_page = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in first_page],
+            ['Comment 0', 'Comment 1', 'Comment 2']
+        )
+        self.assertContains(response, 'Комментарии: 5')
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk,)),
+            {'cursor': first_page.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Comment 3', 'Comment 4']
+        )
+        self.assertNotContains(response, 'data-comments-url')
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='tester')
+        cls.group = Group.objects.create(
+            title='Test title',
+            slug='test',
+            description='Test description'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Test text', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified_without_queries(self):
+        """Повторный запрос с ETag получает 304 без запросов к базе"""
+        urls = (
+            reverse('posts:main_page'),
+            reverse('posts:group_posts_page', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_page_refreshed_after_edit(self):
+        """Правка поста сбрасывает закешированную страницу"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        etag = self.client.get(url)['ETag']
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Edited text'
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Edited text')
+
+    def test_last_modified_moves_after_edit(self):
+        """После правки If-Modified-Since не даёт 304"""
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date=timezone.now() - timedelta(days=1)
+        )
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        last_modified = self.client.get(url)['Last-Modified']
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Edited text'
+        post.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPipelineTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tester')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_thumbnails_rendered_on_save(self):
+        """Миниатюры нарезаются при сохранении поста, а не при показе"""
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(buffer, 'JPEG')
+        uploaded = SimpleUploadedFile(
+            name='big.jpg',
+            content=buffer.getvalue(),
+            content_type='image/jpeg'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Text form', 'image': uploaded}
+        )
+        post = Post.objects.get()
+        self.assertTrue(post.thumbnails_ready)
+        _, name, width, _ = json.loads(post.thumbnail_files)[0]
+        self.assertEqual(width, 480)
+        self.assertTrue(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, name)
+        ))
+        with mock.patch.object(
+            ThumbnailBackend, 'get_thumbnail',
+            side_effect=AssertionError('Нарезка во время запроса')
+        ):
+            response = self.client.get(reverse('posts:main_page'))
+        self.assertContains(response, name)
+
+    def test_responsive_variants(self):
+        """Карточка отдаёт srcset в WebP и запасной JPEG"""
+        self.create_image_post(1)
+        response = self.authorized_client.get(reverse('posts:main_page'))
+        post = response.context['page_obj'][0]
+        self.assertEqual(post.thumbnail.width, 960)
+        self.assertTrue(post.thumbnail.name.endswith('.jpg'))
+        sources = {
+            source['type']: source['srcset']
+            for source in post.thumbnail_sources
+        }
+        self.assertIn('480w', sources['image/webp'])
+        self.assertIn('960w', sources['image/webp'])
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'sizes="')
+
+    def test_api_image_urls_absolute(self):
+        """API отдаёт полные адреса картинки, миниатюры и srcset"""
+        self.create_image_post(1)
+        image = self.client.get(
+            reverse('posts:api_index')
+        ).json()['results'][0]['image']
+        urls = [image['url'], image['thumbnail']] + [
+            candidate.split()[0]
+            for source in image['sources']
+            for candidate in source['srcset'].split(', ')
+        ]
+        self.assertEqual(len(urls), 8)
+        for url in urls:
+            self.assertTrue(url.startswith('http://testserver/'), url)
+
+    def test_generate_thumbnails_command(self):
+        """generate_thumbnails нарезает миниатюры постов без них"""
+        self.create_image_post(1)
+        Post.objects.update(thumbnails_ready=False, thumbnail_files='')
+        call_command('generate_thumbnails', stdout=StringIO())
+        post = Post.objects.get()
+        self.assertTrue(post.thumbnails_ready)
+        self.assertEqual(
+            [image_format for image_format, *_ in json.loads(
+                post.thumbnail_files
+            )],
+            ['WEBP'] * 3 + ['JPEG'] * 3
+        )
+
+    def create_image_post(self, number):
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(buffer, 'JPEG')
+        post = Post.objects.create(
+            author=self.user,
+            text=f'Text {number}',
+            image=SimpleUploadedFile(
+                name=f'image{number}.jpg',
+                content=buffer.getvalue(),
+                content_type='image/jpeg'
+            )
+        )
+        thumbnails.generate(post)
+
+    def page_hits(self):
+        """Число запросов к базе и обращений к кешу при показе ленты"""
+        default_cache = caches['default']
+        with mock.patch.object(
+            default_cache, 'get', wraps=default_cache.get
+        ) as get, mock.patch.object(
+            default_cache, 'get_many', wraps=default_cache.get_many
+        ) as get_many, CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(reverse('posts:main_page'))
+        return len(queries), get.call_count + get_many.call_count
+
+    def test_page_hits_do_not_depend_on_images(self):
+        """Миниатюры страницы находятся за постоянное число обращений"""
+        self.create_image_post(1)
+        cache.clear()
+        hits = self.page_hits()
+        for number in range(2, 6):
+            self.create_image_post(number)
+        cache.clear()
+        with mock.patch.object(
+            ThumbnailBackend, 'get_thumbnail',
+            side_effect=AssertionError('Поиск миниатюры в шаблоне')
+        ):
+            self.assertEqual(self.page_hits(), hits)
+
+
+@override_settings(PAGE_NUMBER=2)
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='tester')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        for text in (
+            'Кот сидит на окне',
+            'Кот, кот и ещё раз кот',
+            'Собака лает',
+            'Котёнок спит',
+        ):
+            Post.objects.create(author=cls.user, text=text)
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query, cursor=None):
+        data = {'q': query}
+        if cursor:
+            data['cursor'] = cursor
+        return self.client.get(reverse('posts:search'), data)
+
+    def test_results_ranked_and_paginated(self):
+        """Поиск находит посты по префиксу и листает их по релевантности"""
+        first = self.search('кот').context['page_obj']
+        self.assertEqual(first[0].text, 'Кот, кот и ещё раз кот')
+        last = self.search('кот', first.next_cursor).context['page_obj']
+        self.assertEqual(len(last), 1)
+        self.assertEqual(last.next_cursor, '')
+        self.assertEqual(
+            {post.text for post in list(first) + list(last)},
+            {'Кот сидит на окне', 'Кот, кот и ещё раз кот', 'Котёнок спит'}
+        )
+        self.assertLessEqual(first[1].rank, last[0].rank)
+        self.assertEqual(first.paginator.count, 3)
+        self.assertEqual(first.paginator.num_pages, 2)
+
+    def test_index_follows_edits(self):
+        """Индекс следует за правкой и удалением постов"""
+        post = Post.objects.get(text='Собака лает')
+        post.text = 'Попугай молчит'
+        post.save()
+        self.assertEqual(len(self.search('собака').context['page_obj']), 0)
+        self.assertEqual(len(self.search('попугай').context['page_obj']), 1)
+        post.delete()
+        self.assertEqual(len(self.search('попугай').context['page_obj']), 0)
+
+    def test_operators_are_escaped(self):
+        """Служебный синтаксис FTS5 в запросе не ломает поиск"""
+        for query in ('"', 'кот OR', 'NEAR(', '*', ''):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query).status_code, 200)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс"""
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'собака'}
+            )
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertTrue(any('MATCH' in query['sql'] for query in queries))
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries))
+
+
+class PostAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {number}', slug=f'group-{number}',
+                description='Описание'
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def create_posts(self, count):
+        start = Post.objects.count()
+        for number in range(start, start + count):
+            Post.objects.create(
+                author=User.objects.create_user(username=f'author{number}'),
+                text=f'Текст {number}',
+                group=self.groups[number % len(self.groups)]
+            )
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist')
+            )
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_changelist_queries_do_not_grow(self):
+        """Список постов в админке не делает запросов на каждую строку"""
+        self.create_posts(2)
+        self.changelist_queries()
+        few = len(self.changelist_queries())
+        self.create_posts(6)
+        queries = self.changelist_queries()
+        self.assertEqual(len(queries), few)
+        self.assertFalse(any(
+            sql.startswith('SELECT COUNT(*)') for sql in queries
+        ))
+
+    def edit_all_queries(self):
+        """Правит текст всех постов через list_editable списка."""
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        formset = response.context['cl'].formset
+        data = {
+            f'{formset.prefix}-TOTAL_FORMS': len(formset.forms),
+            f'{formset.prefix}-INITIAL_FORMS': len(formset.forms),
+            '_save': 'Сохранить',
+        }
+        for form in formset.forms:
+            data[form.add_prefix('id')] = form.instance.pk
+            data[form.add_prefix('text')] = f'{form.instance.text} ред.'
+            data[form.add_prefix('group')] = form.instance.group_id
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('admin:posts_post_changelist'), data
+            )
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_list_editable_save(self):
+        """Сохранение списка не ломается о бюджет и не растёт по строкам"""
+        self.create_posts(2)
+        few = self.edit_all_queries()
+        self.create_posts(4)
+        many = self.edit_all_queries()
+        # Проверка формы, UPDATE, журнал админки и точка сохранения.
+        self.assertLessEqual(many - few, 4 * 7)
+        self.assertTrue(
+            Post.objects.filter(text__endswith='ред. ред.').exists()
+        )
+
+    def test_comment_and_follow_filters(self):
+        """Фильтры комментариев и подписок ищут по началу имени и номеру"""
+        self.create_posts(3)
+        post = Post.objects.first()
+        reader = User.objects.create_user(username='reader')
+        Comment.objects.create(post=post, author=reader, text='Комментарий')
+        Follow.objects.create(user=reader, author=post.author)
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'),
+            {'author__username': 'rea', 'post': post.pk}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, 'name="author__username"')
+        response = self.client.get(
+            reverse('admin:posts_follow_changelist'),
+            {'user__username': 'rea', 'author__username': 'xyz'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_comment_and_follow_search_uses_prefix(self):
+        """Поиск комментариев и подписок по имени идёт без LIKE"""
+        self.create_posts(1)
+        post = Post.objects.first()
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=post.author)
+        Comment.objects.create(post=post, author=reader, text='Комментарий')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_follow_changelist'), {'q': 'rea'}
+            )
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries))
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'rea'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'xyz'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_user_autocomplete_uses_prefix(self):
+        """Автодополнение пользователей ищет по началу имени без LIKE"""
+        self.create_posts(2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:auth_user_autocomplete'), {'term': 'auth'}
+            )
+        self.assertEqual(
+            sorted(item['text'] for item in response.json()['results']),
+            ['author0', 'author1']
+        )
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries))
+
+    def test_move_to_group_action(self):
+        """Действие админки переносит выбранные посты в группу"""
+        self.create_posts(3)
+        target = self.groups[0]
+        ids = list(Post.objects.values_list('pk', flat=True))
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'move_to_group',
+                '_selected_action': ids,
+                'group': target.pk,
+            },
+            follow=True
+        )
+        self.assertContains(response, f'Перенесено в «{target}»: 3')
+        self.assertEqual(Post.objects.filter(group=target).count(), 3)
+        target.refresh_from_db()
+        self.assertEqual(target.posts_count, 3)
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(settings.PAGE_NUMBER + 3):
+            Post.objects.create(
+                author=cls.author, text=f'Текст {number}', group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_paginate_with_cursor(self):
+        """Ленты в JSON листаются курсором и встраивают автора и группу"""
+        self.client.force_login(self.reader)
+        for url in (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_posts', args=(self.group.slug,)),
+            reverse('posts:api_profile', args=(self.author.username,)),
+            reverse('posts:api_follow_index'),
+        ):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(
+                    len(data['results']), settings.PAGE_NUMBER
+                )
+                self.assertEqual(data['results'][0]['author'], {
+                    'id': self.author.pk,
+                    'username': 'author',
+                    'full_name': 'Лев Толстой',
+                })
+                self.assertEqual(
+                    data['results'][0]['group']['slug'], self.group.slug
+                )
+                self.assertIsNone(data['previous'])
+                data = self.client.get(data['next']).json()
+                self.assertEqual(len(data['results']), 3)
+                self.assertIsNone(data['next'])
+
+    def test_sparse_fields(self):
+        """fields= выбирает только нужные колонки и связи"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:api_index'), {'fields': 'id,text'}
+            )
+        self.assertEqual(
+            set(response.json()['results'][0]), {'id', 'text'}
+        )
+        sql = queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('image', sql)
+        response = self.client.get(
+            reverse('posts:api_index'), {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag_and_errors(self):
+        """Ответы отдают ETag, ошибки приходят в JSON"""
+        url = reverse('posts:api_index')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.client.force_login(self.reader)
+        etag = self.client.get(reverse('posts:api_follow_index'))['ETag']
+        response = self.client.get(
+            reverse('posts:api_follow_index'), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.client.logout()
+        response = self.client.get(reverse('posts:api_follow_index'))
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get(
+            reverse('posts:api_profile', args=('nobody',))
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0, EXPORT_CHUNK_SIZE=2
+)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Текст {number}', group=cls.group
+            )
+            for number in range(5)
+        ]
+        cls.posts[0].image = SimpleUploadedFile(
+            'export.gif', b'GIF89a-image', content_type='image/gif'
+        )
+        cls.posts[0].save()
+        Comment.objects.create(
+            post=cls.posts[1], author=cls.author, text='Сам себе'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def test_jsonl_export(self):
+        """Выгрузка отдаёт все записи автора потоком, порциями по ключу"""
+        response = self.client.get(reverse('posts:export'))
+        self.assertTrue(response.streaming)
+        records = [
+            json.loads(line) for line in
+            b''.join(response.streaming_content).decode().splitlines()
+        ]
+        models = [record['model'] for record in records]
+        self.assertEqual(models.count('post'), 5)
+        self.assertEqual(models.count('comment'), 1)
+        self.assertIn(
+            {'model': 'follow', 'user': 'reader', 'author': 'author'},
+            records
+        )
+        self.assertEqual(
+            {record['id'] for record in records if record['model'] == 'post'},
+            {post.pk for post in self.posts}
+        )
+
+    def test_zip_export_with_images(self):
+        """ZIP-выгрузка содержит данные и файлы картинок"""
+        response = self.client.get(reverse('posts:export'), {'format': 'zip'})
+        archive = zipfile.ZipFile(
+            BytesIO(b''.join(response.streaming_content))
+        )
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(
+            archive.read(f'media/{self.posts[0].image.name}'), b'GIF89a-image'
+        )
+        self.assertIn(b'"model": "post"', archive.read('data.jsonl'))
+
+    def test_command_matches_view(self):
+        """Команда выгружает то же, что и страница выгрузки"""
+        output = os.path.join(TEMP_MEDIA_ROOT, 'export.jsonl')
+        call_command('export_data', 'author', '--output', output)
+        with open(output, 'rb') as file:
+            exported = file.read()
+        response = self.client.get(reverse('posts:export'))
+        self.assertEqual(exported, b''.join(response.streaming_content))
+
+
+class FeedsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(settings.FEED_LENGTH + 5):
+            Post.objects.create(
+                author=cls.author, text=f'Запись {number}', group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_render_bounded_entries(self):
+        """Ленты RSS и Atom отдают FEED_LENGTH записей парой запросов"""
+        for url, content_type in (
+            (reverse('posts:index_rss'), 'application/rss+xml'),
+            (reverse('posts:index_atom'), 'application/atom+xml'),
+            (
+                reverse('posts:group_rss', args=(self.group.slug,)),
+                'application/rss+xml'
+            ),
+            (
+                reverse('posts:profile_atom', args=(self.author.username,)),
+                'application/atom+xml'
+            ),
+        ):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type
+                ))
+                self.assertEqual(
+                    response.content.count(b'<item>')
+                    + response.content.count(b'<entry>'),
+                    settings.FEED_LENGTH
+                )
+                self.assertLessEqual(len(queries), 4)
+        response = self.client.get(
+            reverse('posts:group_rss', args=('missing',))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_per_host_and_scheme(self):
+        """Абсолютные ссылки ленты не переходят между хостами и схемами"""
+        url = reverse('posts:index_rss')
+        self.assertContains(
+            self.client.get(url, HTTP_HOST='localhost'), 'http://localhost/'
+        )
+        response = self.client.get(url, HTTP_HOST='127.0.0.1', secure=True)
+        self.assertContains(response, 'https://127.0.0.1/')
+        self.assertNotContains(response, 'http://localhost/')
+
+    def test_conditional_requests_and_invalidation(self):
+        """Поллер получает 304, новый пост сбрасывает ленту"""
+        url = reverse('posts:group_atom', args=(self.group.slug,))
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        not_modified = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        Post.objects.create(
+            author=self.author, text='Свежая запись', group=self.group
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Свежая запись')
+
+
+@override_settings(
+    POST_EVENTS_POLL_INTERVAL=0.01,
+    POST_EVENTS_KEEPALIVE=0.02,
+    POST_EVENTS_WSGI_DURATION=0.1,
+)
+class FollowEventsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def read_stream(self, **headers):
+        response = self.client.get(reverse('posts:follow_events'), **headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_stream_sends_only_followed_authors(self):
+        """Поток отдаёт только посты авторов из подписок"""
+        followed = Post.objects.create(author=self.author, text='Своё')
+        Post.objects.create(author=self.stranger, text='Чужое')
+        stream = self.read_stream(HTTP_LAST_EVENT_ID='0')
+        self.assertIn('event: post', stream)
+        self.assertIn(f'"id": {followed.pk}', stream)
+        self.assertNotIn('Чужое', stream)
+        self.assertIn(': keepalive', stream)
+        self.assertIn(f'retry: {settings.POST_EVENTS_WSGI_RETRY}', stream)
+
+    def test_resume_from_last_event_id(self):
+        """Без Last-Event-ID старые события не повторяются"""
+        Post.objects.create(author=self.author, text='Старое')
+        self.assertNotIn('Старое', self.read_stream())
+        last_id = PostEvent.objects.latest('pk').pk
+        Post.objects.create(author=self.author, text='Новое')
+        stream = self.read_stream(HTTP_LAST_EVENT_ID=str(last_id))
+        self.assertNotIn('Старое', stream)
+        self.assertIn('Новое', stream)
+
+
+@override_settings(
+    POST_EVENTS_POLL_INTERVAL=5,
+    POST_EVENTS_KEEPALIVE=5,
+    POST_EVENTS_STREAM_DURATION=0.5,
+)
+class AsyncFollowEventsTest(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        self.application = Bridge(WSGIHandler(), {
+            reverse('posts:follow_events'): asgi.follow_events,
+        })
+        self.addCleanup(self.application.executor.shutdown)
+
+    def test_publish_wakes_stream(self):
+        """Новый пост будит асинхронный поток раньше очередного опроса"""
+        session = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': reverse('posts:follow_events'),
+            'query_string': b'',
+            'headers': [
+                (b'host', b'testserver'),
+                (
+                    b'cookie',
+                    f'{settings.SESSION_COOKIE_NAME}={session}'.encode()
+                ),
+            ],
+        }
+        requested = []
+        sent = []
+
+        async def receive():
+            if not requested:
+                requested.append(True)
+                return {'type': 'http.request', 'body': b''}
+            await asyncio.sleep(10)
+
+        async def send(message):
+            sent.append(message)
+
+        def publish():
+            time.sleep(0.1)
+            Post.objects.create(author=self.author, text='Срочно')
+
+        async def run():
+            await asyncio.gather(
+                self.application(scope, receive, send),
+                self.application.run(publish),
+            )
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run())
+        finally:
+            loop.close()
+        self.assertEqual(sent[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        self.assertIn('Срочно'.encode(), body)
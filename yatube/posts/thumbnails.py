@@ -0,0 +1,186 @@
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+from .signals import bump_post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+class AvifThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl (THUMBNAIL_BACKEND), который знает расширение AVIF.
+
+    Имя файла строится так же, как в sorl, но по своему словарю
+    расширений, а не по общему EXTENSIONS.
+    """
+
+    extensions = dict(EXTENSIONS, AVIF='avif')
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        extension = self.extensions[options['format']]
+        return (
+            f'{thumbnail_settings.THUMBNAIL_PREFIX}'
+            f'{key[:2]}/{key[2:4]}/{key}.{extension}'
+        )
+
+
+def executor():
+    """Пул процессов для нарезки, создаётся при первом обращении.
+
+    Процессы запускаются через spawn: fork процесса с потоками
+    и открытыми соединениями небезопасен. Django в них настраивается
+    заново.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+    return _executor
+
+
+def avif_supported():
+    try:
+        return features.check_module('avif')
+    except ValueError:
+        return False
+
+
+def thumbnail_formats():
+    """Форматы миниатюр; AVIF добавляется, если его умеет Pillow."""
+    if avif_supported():
+        return ('AVIF',) + settings.POST_THUMBNAIL_FORMATS
+    return settings.POST_THUMBNAIL_FORMATS
+
+
+def render(source_name):
+    """Нарезает все миниатюры картинки через get_thumbnail.
+
+    Возвращает [формат, имя, ширина, высота] каждой миниатюры:
+    по форматам, а внутри формата - по возрастанию ширины.
+    """
+    files = []
+    for image_format in thumbnail_formats():
+        for geometry in settings.POST_THUMBNAIL_SIZES:
+            thumbnail = get_thumbnail(
+                source_name, geometry,
+                format=image_format, **settings.POST_THUMBNAIL_OPTIONS
+            )
+            files.append([
+                image_format, thumbnail.name, thumbnail.width, thumbnail.height
+            ])
+    return files
+
+
+def render_in_pool(source_name):
+    """render для процесса пула: соединения закрываются после задачи."""
+    try:
+        return render(source_name)
+    finally:
+        close_old_connections()
+
+
+def record(post_id, source_name, files):
+    """Сохраняет миниатюры в посте и отмечает их готовыми.
+
+    Пост меняется, только если картинку не успели сменить, а версии
+    кешей страниц сдвигаются, чтобы они взяли готовые миниатюры.
+    """
+    posts = Post.objects.filter(pk=post_id, image=source_name)
+    if posts.update(thumbnails_ready=True, thumbnail_files=json.dumps(files)):
+        post = posts.select_related('author').get()
+        bump_post(post, post.group_id)
+
+
+def _finished(post_id, source_name, future):
+    close_old_connections()
+    try:
+        record(post_id, source_name, future.result())
+    except Exception:
+        logger.exception('Не удалось нарезать миниатюры поста %s', post_id)
+    finally:
+        close_old_connections()
+
+
+def generate(post):
+    """Нарезает миниатюры поста в текущем процессе."""
+    source_name = post.image.name
+    record(post.pk, source_name, render(source_name))
+
+
+def schedule(post):
+    """Ставит нарезку миниатюр в пул после фиксации транзакции.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры режутся сразу, в том же процессе.
+    """
+    if not post.image:
+        return
+    source_name = post.image.name
+
+    def submit():
+        if not settings.THUMBNAIL_WORKERS:
+            return generate(post)
+        future = executor().submit(render_in_pool, source_name)
+        future.add_done_callback(partial(_finished, post.pk, source_name))
+
+    transaction.on_commit(submit)
+
+
+def srcset(thumbnails, url=str):
+    """srcset миниатюр; url может превратить адрес файла в полный."""
+    return ', '.join(
+        f'{url(thumbnail.url)} {thumbnail.width}w' for thumbnail in thumbnails
+    )
+
+
+def preload(posts):
+    """Раскладывает сохранённые в постах миниатюры для шаблона.
+
+    Имена и размеры берутся из post.thumbnail_files, поэтому страница
+    не обращается к хранилищу ключей sorl. В post.thumbnail кладётся
+    самая широкая миниатюра запасного формата, в post.thumbnail_sources -
+    srcset по форматам вместе с самими миниатюрами.
+    """
+    fallback_format = thumbnail_formats()[-1]
+    for post in posts:
+        post.thumbnail = None
+        post.thumbnail_sources = []
+        if not (post.image and post.thumbnails_ready and post.thumbnail_files):
+            continue
+        by_format = {}
+        for image_format, name, width, height in json.loads(
+            post.thumbnail_files
+        ):
+            thumbnail = ImageFile(name, default.storage)
+            thumbnail.set_size((width, height))
+            by_format.setdefault(image_format, []).append(thumbnail)
+        if fallback_format not in by_format:
+            continue
+        post.thumbnail = by_format[fallback_format][-1]
+        post.thumbnail_sources = [
+            {
+                'type': f'image/{image_format.lower()}',
+                'srcset': srcset(thumbnails),
+                'thumbnails': thumbnails,
+            }
+            for image_format, thumbnails in by_format.items()
+        ]
+    return posts
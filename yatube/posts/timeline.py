@@ -0,0 +1,260 @@
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .utils import CursorPaginator, keyset
+
+FEED_ORDERING = ('-pub_date', '-id')
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def is_heavy(author_id):
+    """Ленты с постами автора собираются слиянием при чтении."""
+    return UserStats.objects.filter(
+        user_id=author_id, timeline_merged=True
+    ).exists()
+
+
+def heavy_authors(user_id):
+    """Id популярных авторов среди подписок пользователя."""
+    return list(UserStats.objects.filter(
+        user__following__user_id=user_id, timeline_merged=True
+    ).values_list('user_id', flat=True))
+
+
+def _author_cache_key(author_id):
+    return f'author_timeline:{author_id}'
+
+
+def author_timeline(author_id):
+    """Ключи (pub_date, id) последних постов автора, от новых к старым."""
+    key = _author_cache_key(author_id)
+    recent = cache.get(key)
+    if recent is None:
+        recent = list(Post.objects.filter(
+            author_id=author_id
+        ).order_by(*FEED_ORDERING).values_list(
+            'pub_date', 'id'
+        )[:settings.AUTHOR_TIMELINE_LENGTH])
+        cache.set(key, recent, None)
+    return recent
+
+
+def forget_author_timeline(*author_ids):
+    cache.delete_many([
+        _author_cache_key(author_id) for author_id in author_ids
+    ])
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Посты популярных авторов не копируются: их подмешивает FeedPaginator.
+    """
+    forget_author_timeline(post.author_id)
+    if is_heavy(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    with transaction.atomic():
+        _bulk_insert(
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        )
+
+
+def recent_posts(author_id):
+    """Последние TIMELINE_FOLLOW_POSTS постов автора, от новых к старым."""
+    return Post.objects.filter(
+        author_id=author_id
+    ).order_by(*FEED_ORDERING)[:settings.TIMELINE_FOLLOW_POSTS]
+
+
+def add_author(user_id, author_id):
+    """Добавляет в ленту пользователя последние посты автора.
+
+    Более старые посты в ленту не попадают: подписка не должна
+    копировать всю историю автора в запросе пользователя.
+    """
+    if is_heavy(author_id):
+        return
+    posts = recent_posts(author_id).values_list('id', 'pub_date')
+    with transaction.atomic():
+        _bulk_insert(
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
+
+
+def followers_changed(author_id):
+    """Переводит автора на слияние при чтении, когда число подписчиков
+    дошло до FANOUT_FOLLOWER_THRESHOLD.
+
+    Меняется только отметка в UserStats: оставшиеся в лентах записи
+    автора при слиянии не мешают и убираются командой
+    rebalance_timelines. Обратно автор переводится той же командой,
+    когда подписчиков меньше FANOUT_DEMOTE_THRESHOLD.
+    """
+    UserStats.objects.filter(
+        user_id=author_id,
+        timeline_merged=False,
+        followers_count__gte=settings.FANOUT_FOLLOWER_THRESHOLD
+    ).update(timeline_merged=True)
+
+
+def spread_author(author_id):
+    """Раскладывает последние посты автора по лентам его подписчиков."""
+    posts = list(recent_posts(author_id).values_list('id', 'pub_date'))
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in followers.iterator()
+        for post_id, pub_date in posts
+    )
+
+
+def rebalance():
+    """Доводит ленты до отметок timeline_merged.
+
+    Авторы с FANOUT_FOLLOWER_THRESHOLD подписчиков и больше переводятся
+    на слияние, их записи убираются из лент. Авторы со слиянием, у
+    которых подписчиков меньше FANOUT_DEMOTE_THRESHOLD, раскладываются
+    по лентам. Возвращает (переведённых на слияние, разложенных).
+    """
+    merged = UserStats.objects.filter(
+        timeline_merged=False,
+        followers_count__gte=settings.FANOUT_FOLLOWER_THRESHOLD
+    ).update(timeline_merged=True)
+    stale = UserStats.objects.filter(
+        timeline_merged=True,
+        followers_count__gte=settings.FANOUT_DEMOTE_THRESHOLD,
+        user__posts__timeline_entries__isnull=False
+    ).values_list('user_id', flat=True).distinct()
+    for author_id in list(stale):
+        TimelineEntry.objects.filter(post__author_id=author_id).delete()
+    demoted = UserStats.objects.filter(
+        timeline_merged=True,
+        followers_count__lt=settings.FANOUT_DEMOTE_THRESHOLD
+    ).values_list('user_id', flat=True)
+    spread = 0
+    for author_id in list(demoted):
+        with transaction.atomic():
+            spread_author(author_id)
+            UserStats.objects.filter(user_id=author_id).update(
+                timeline_merged=False
+            )
+        spread += 1
+    return merged, spread
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты пользователя посты автора."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user_id):
+    """Пересобирает ленту пользователя по текущим подпискам."""
+    authors = Follow.objects.filter(
+        user_id=user_id
+    ).values_list('author_id', flat=True)
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        for author_id in authors:
+            add_author(user_id, author_id)
+
+
+def diff(user_id):
+    """Возвращает (недостающие, лишние) id постов в ленте пользователя.
+
+    Записи популярных авторов в ленте не обязательны и не считаются
+    лишними. Обязательны только последние посты каждого автора, как
+    их кладёт add_author; более старые допустимы, если уже есть.
+    """
+    heavy = heavy_authors(user_id)
+    authors = Follow.objects.filter(
+        user_id=user_id
+    ).exclude(author_id__in=heavy).values_list('author_id', flat=True)
+    expected = set()
+    for author_id in authors:
+        expected.update(recent_posts(author_id).values_list('id', flat=True))
+    allowed = set(Post.objects.filter(
+        author__following__user_id=user_id
+    ).exclude(author_id__in=heavy).values_list('id', flat=True))
+    stored = set(TimelineEntry.objects.filter(
+        user_id=user_id
+    ).exclude(post__author_id__in=heavy).values_list('post_id', flat=True))
+    return expected - stored, stored - allowed
+
+
+class FeedPaginator(CursorPaginator):
+    """Лента подписок: материализованная лента плюс слияние лент
+    популярных авторов, которые не раскладываются по подписчикам.
+    """
+
+    def __init__(self, user, per_page, posts=None):
+        if posts is None:
+            posts = Post.objects.select_related('author', 'group')
+        super().__init__(
+            posts.filter(author__following__user=user),
+            per_page,
+            FEED_ORDERING
+        )
+        self.user = user
+        self.posts = posts
+
+    def stored_keys(self, values, reverse, limit):
+        entries = TimelineEntry.objects.filter(
+            user=self.user
+        ).values_list('pub_date', 'post_id')
+        ordering = ('-pub_date', '-post_id')
+        return list(keyset(entries, ordering, values, reverse)[:limit])
+
+    def author_keys(self, author_id, values, reverse, limit):
+        recent = author_timeline(author_id)
+        complete = len(recent) < settings.AUTHOR_TIMELINE_LENGTH
+        if reverse:
+            candidates = [key for key in reversed(recent) if key > values]
+            covered = complete or (recent and recent[-1] < values)
+        else:
+            candidates = [
+                key for key in recent if values is None or key < values
+            ]
+            covered = complete or len(candidates) >= limit
+        if covered:
+            return candidates[:limit]
+        posts = Post.objects.filter(
+            author_id=author_id
+        ).values_list('pub_date', 'id')
+        return list(keyset(posts, FEED_ORDERING, values, reverse)[:limit])
+
+    def fetch(self, values, reverse, limit):
+        if values is not None:
+            values = tuple(values)
+        sources = [self.stored_keys(values, reverse, limit)]
+        sources += [
+            self.author_keys(author_id, values, reverse, limit)
+            for author_id in heavy_authors(self.user.pk)
+        ]
+        post_ids = []
+        for _, post_id in heapq.merge(*sources, reverse=not reverse):
+            if post_id not in post_ids:
+                post_ids.append(post_id)
+            if len(post_ids) == limit:
+                break
+        posts = self.posts.in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
@@ -1,8 +1,154 @@
+import base64
+import binascii
+import json
+from functools import partial
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.http import http_date
+
+
+def keyset(queryset, ordering, values, reverse=False):
+    """Сортирует queryset по паре полей и отбрасывает всё до ключа values.
+
+    При reverse обход идёт в обратную сторону: к началу ленты.
+    """
+    first, second = (field.lstrip('-') for field in ordering)
+    descending = ordering[0].startswith('-')
+    lookup = 'lt' if descending != reverse else 'gt'
+    if values is not None:
+        queryset = queryset.filter(
+            Q(**{f'{first}__{lookup}': values[0]})
+            | Q(**{first: values[0], f'{second}__{lookup}': values[1]})
+        )
+    if reverse:
+        ordering = tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in ordering
+        )
+    return queryset.order_by(*ordering)
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре полей без COUNT и OFFSET.
+
+    Страница выбирается условием на ключ последней показанной записи,
+    поэтому читается по индексу за одно и то же время на любой глубине.
+    Соседние страницы Page узнаёт по курсорам; count и num_pages
+    считаются обычным COUNT только при обращении, шаблоны курсорных
+    страниц их не читают.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        super().__init__(object_list, per_page)
+        self.ordering = ordering
+        self.fields = tuple(field.lstrip('-') for field in ordering)
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [getattr(obj, field) for field in self.fields]
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in values
+        ]
+        raw = json.dumps(values + [int(reverse)]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def parse_value(self, field, value):
+        model = self.object_list.model
+        return model._meta.get_field(field).to_python(value)
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            *values, reverse = json.loads(raw.decode())
+            if len(values) != len(self.fields):
+                return None, False
+            values = [
+                self.parse_value(field, value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (
+            binascii.Error, UnicodeDecodeError, ValueError,
+            TypeError, ValidationError,
+        ):
+            return None, False
+        if None in values:
+            return None, False
+        return values, bool(reverse)
+
+    def fetch(self, values, reverse, limit):
+        """Записи после ключа values в порядке обхода."""
+        queryset = keyset(self.object_list, self.ordering, values, reverse)
+        return list(queryset[:limit])
 
+    def get_page(self, cursor=None):
+        values, reverse = self.decode_cursor(cursor)
+        rows = self.fetch(values, reverse, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            if not has_more:
+                return self.get_page()
+            rows.reverse()
+        page = Page(rows, 1, self)
+        page.cursor = cursor or ''
+        page.next_cursor = ''
+        page.previous_cursor = ''
+        if rows and (reverse or has_more):
+            page.next_cursor = self.encode_cursor(rows[-1])
+        if rows and values is not None:
+            page.previous_cursor = self.encode_cursor(rows[0], reverse=True)
+        page.has_next = partial(bool, page.next_cursor)
+        page.has_previous = partial(bool, page.previous_cursor)
+        page.has_other_pages = partial(
+            bool, page.next_cursor or page.previous_cursor
+        )
+        return page
 
-def paginator_func(request, posts_list):
-    paginator = Paginator(posts_list, settings.PAGE_NUMBER)
+
+def paginator_func(request, posts_list, cursor_paginator=None):
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is not None:
+        paginator = Paginator(posts_list, settings.PAGE_NUMBER)
+        return paginator.get_page(page_number)
+    if cursor_paginator is None:
+        cursor_paginator = CursorPaginator(posts_list, settings.PAGE_NUMBER)
+    return cursor_paginator.get_page(request.GET.get('cursor'))
+
+
+def comments_page(request, post):
+    comments = post.comments.select_related('author')
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PAGE_NUMBER, ('created', 'id')
+    )
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def index_namespaces():
+    return ('posts', 'groups')
+
+
+def group_namespaces(slug):
+    return (f'group:{slug}', 'groups')
+
+
+def profile_namespaces(username):
+    return (f'author:{username}', 'groups')
+
+
+def post_namespaces(post_id):
+    return (f'post:{post_id}', 'posts', 'groups')
+
+
+def set_last_modified(response, dates):
+    """Ставит Last-Modified по самой свежей из дат."""
+    dates = [date for date in dates if date]
+    if dates:
+        response['Last-Modified'] = http_date(max(dates).timestamp())
+    return response
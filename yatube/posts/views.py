@@ -1,35 +1,63 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
+from django.http import StreamingHttpResponse
+from django.utils.http import urlencode
 
+from core.cache import get_version
+from core.decorators import cache_anonymous_page
+
+from . import events, export, thumbnails
 from .forms import PostForm, CommentForm
 from .models import Follow, Group, Post, User
-from .utils import paginator_func
+from .search import SearchPaginator
+from .timeline import FeedPaginator
+from .utils import (
+    comments_page, group_namespaces, index_namespaces, paginator_func,
+    post_namespaces, profile_namespaces, set_last_modified
+)
 
 
+@cache_anonymous_page(index_namespaces)
 def index(request):
     posts_list = Post.objects.select_related('author', 'group').all()
     page_obj = paginator_func(request, posts_list)
+    thumbnails.preload(page_obj)
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'cache_version': get_version(*index_namespaces())
     }
-    return render(request, 'posts/index.html', context)
+    return set_last_modified(
+        render(request, 'posts/index.html', context),
+        (post.pub_date for post in page_obj)
+    )
 
 
+@cache_anonymous_page(group_namespaces)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts_list = group.posts.select_related('author').all()
     page_obj = paginator_func(request, posts_list)
+    thumbnails.preload(page_obj)
     context = {
         'group': group,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'cache_version': get_version(*group_namespaces(slug))
     }
-    return render(request, 'posts/group_list.html', context)
+    return set_last_modified(
+        render(request, 'posts/group_list.html', context),
+        (post.pub_date for post in page_obj)
+    )
 
 
+@cache_anonymous_page(profile_namespaces)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     author_posts = author.posts.select_related('group')
     page_obj = paginator_func(request, author_posts)
+    thumbnails.preload(page_obj)
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user
     ).filter(
@@ -38,23 +66,55 @@ def profile(request, username):
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        'cache_version': get_version(*profile_namespaces(username))
     }
-    return render(request, 'posts/profile.html', context)
+    return set_last_modified(
+        render(request, 'posts/profile.html', context),
+        (post.pub_date for post in page_obj)
+    )
 
 
+@cache_anonymous_page(post_namespaces)
 def post_detail(request, post_id):
-    post = Post.objects.select_related('author').prefetch_related(
-        'comments__author'
-    ).get(pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
     form = CommentForm()
+    thumbnails.preload([post])
+    comments = comments_page(request, post)
     context = {
         'post': post,
         'form': form,
         'comments': comments
     }
-    return render(request, 'posts/post_detail.html', context)
+    return set_last_modified(
+        render(request, 'posts/post_detail.html', context),
+        [post.pub_date] + [comment.created for comment in comments]
+    )
+
+
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post)
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+@cache_anonymous_page(index_namespaces)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = SearchPaginator(query, settings.PAGE_NUMBER)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    thumbnails.preload(page_obj)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'query_string': urlencode({'q': query}) + '&'
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
@@ -65,6 +125,7 @@ def post_create(request):
     post = form.save(False)
     post.author = request.user
     post.save()
+    thumbnails.schedule(post)
     return redirect('posts:profile', username=request.user.username)
 
 
@@ -81,6 +142,8 @@ def post_edit(request, post_id):
     if not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
     form.save()
+    if 'image' in form.changed_data:
+        thumbnails.schedule(post)
     return redirect('posts:post_detail', post_id=post.pk)
 
 
@@ -98,21 +161,58 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts_list = Post.objects.select_related('author', 'group').filter(
-        author__following__user=request.user
-    )
-    page_obj = paginator_func(request, posts_list)
+    paginator = FeedPaginator(request.user, settings.PAGE_NUMBER)
+    page_obj = paginator_func(request, paginator.object_list, paginator)
+    thumbnails.preload(page_obj)
     context = {
         'page_obj': page_obj
     }
     return render(request, 'posts/follow.html', context)
 
 
+@login_required
+def export_data(request):
+    if request.GET.get('format') == 'zip':
+        response = StreamingHttpResponse(
+            export.archive(request.user), content_type='application/zip'
+        )
+        extension = 'zip'
+    else:
+        response = StreamingHttpResponse(
+            export.jsonl(request.user), content_type='application/x-ndjson'
+        )
+        extension = 'jsonl'
+    response['Content-Disposition'] = (
+        f'attachment; filename="{request.user.username}.{extension}"'
+    )
+    return response
+
+
+@login_required
+def follow_events(request):
+    """Поток SSE под WSGI: короткий опрос, чтобы не держать воркер.
+
+    Под ASGI этот путь обслуживает posts.asgi.follow_events.
+    """
+    last_id = request.META.get('HTTP_LAST_EVENT_ID', '')
+    response = StreamingHttpResponse(
+        events.stream(
+            request.user,
+            int(last_id) if last_id.isdigit() else None,
+            duration=settings.POST_EVENTS_WSGI_DURATION,
+            retry=settings.POST_EVENTS_WSGI_RETRY,
+        ),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def profile_follow(request, username):
-    user = request.user
-    author = User.objects.get(username=username)
-    if user != author:
+    author = get_object_or_404(User, username=username)
+    if request.user != author:
         Follow.objects.get_or_create(
             user=request.user,
             author=author
@@ -122,7 +222,7 @@ def profile_follow(request, username):
 
 @login_required
 def profile_unfollow(request, username):
-    Follow.objects.get(
+    Follow.objects.filter(
         user=request.user,
         author__username=username
     ).delete()
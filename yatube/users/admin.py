@@ -0,0 +1,15 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
+
+from core.admin import PrefixSearchMixin
+
+User = get_user_model()
+
+
+class UserPrefixAdmin(PrefixSearchMixin, UserAdmin):
+    prefix_search_field = 'username'
+
+
+admin.site.unregister(User)
+admin.site.register(User, UserPrefixAdmin)
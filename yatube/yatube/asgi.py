@@ -0,0 +1,25 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 has no ASGI handler of its own, so the WSGI application is
+wrapped in core.asgi.Bridge: request bodies are read asynchronously,
+views run in a bounded thread pool and the follow events stream is
+served by an async handler that does not hold a thread while idle.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+wsgi_application = get_wsgi_application()
+
+from django.urls import reverse  # noqa: E402
+
+from core.asgi import Bridge  # noqa: E402
+from posts.asgi import follow_events  # noqa: E402
+
+application = Bridge(wsgi_application, {
+    reverse('posts:follow_events'): follow_events,
+})
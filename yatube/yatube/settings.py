@@ -28,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -111,12 +112,105 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
+
+TIMELINE_BATCH_SIZE = 500
+
+# Сколько последних постов автора попадает в ленту при подписке.
+TIMELINE_FOLLOW_POSTS = 200
+
+# С FANOUT_FOLLOWER_THRESHOLD подписчиков посты автора перестают
+# раскладываться по лентам и подмешиваются при чтении. Обратно автора
+# переводит rebalance_timelines, когда подписчиков меньше
+# FANOUT_DEMOTE_THRESHOLD: отписка и подписка у порога ничего не двигают.
+FANOUT_FOLLOWER_THRESHOLD = 1000
+
+FANOUT_DEMOTE_THRESHOLD = 800
+
+AUTHOR_TIMELINE_LENGTH = 200
+
+COMMENTS_PAGE_NUMBER = 20
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+FEED_LENGTH = 20
+
+# Поток SSE о новых постах: сколько событий хранить и выбирать за раз,
+# период опроса таблицы событий, keepalive и длительность соединения
+# в секундах, задержка переподключения клиента в миллисекундах.
+POST_EVENTS_KEEP = 10000
+POST_EVENTS_BATCH = 100
+POST_EVENTS_POLL_INTERVAL = 1
+POST_EVENTS_KEEPALIVE = 15
+POST_EVENTS_STREAM_DURATION = 300
+POST_EVENTS_RETRY = 3000
+# Под WSGI соединение занимает синхронный воркер, поэтому там поток
+# закрывается через несколько секунд, а клиент переподключается реже.
+POST_EVENTS_WSGI_DURATION = 3
+POST_EVENTS_WSGI_RETRY = 15000
+
+# Сколько строк меняют за один запрос массовые действия модерации.
+MODERATION_BATCH_SIZE = 500
+
+# Сколько строк читает выгрузка данных пользователя за один запрос.
+EXPORT_CHUNK_SIZE = 2000
+
+# Загружаемые картинки: предельный размер файла, число пикселей
+# (у анимации - во всех кадрах вместе), длина большей стороны после
+# ужатия и качество JPEG.
+IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+
+IMAGE_MAX_PIXELS = 60 * 1000 * 1000
+
+IMAGE_MAX_ANIMATION_PIXELS = 100 * 1000 * 1000
+
+IMAGE_MAX_SIDE = 2048
+
+IMAGE_QUALITY = 85
+
+# Размер превью, которое показывается до загрузки миниатюры.
+IMAGE_PLACEHOLDER_SIZE = (24, 8)
+
+# Миниатюры постов: размеры по возрастанию ширины, общие параметры
+# sorl-thumbnail и форматы. Последний формат - запасной для <img>.
+POST_THUMBNAIL_SIZES = ('480x170', '720x254', '960x339')
+
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+
+POST_THUMBNAIL_FORMATS = ('WEBP', 'JPEG')
+
+# Бэкенд sorl-thumbnail с расширением файлов для AVIF.
+THUMBNAIL_BACKEND = 'posts.thumbnails.AvifThumbnailBackend'
+
+# Число процессов для нарезки миниатюр, 0 - резать в процессе запроса.
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+# Потоков для представлений под ASGI (yatube/asgi.py).
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 8))
+
+# Бюджет SQL-запросов на представление (core.middleware): всего
+# запросов и повторов запроса одной формы. QUERY_BUDGETS уточняет
+# бюджет по имени маршрута или шаблону вроде 'admin:*'. При 'raise'
+# превышение - ошибка, при 'log' - предупреждение в лог; ключ 'action'
+# в бюджете меняет это для одного представления. Тесты запускаются
+# с 'raise' (yatube/test_settings.py).
+QUERY_BUDGET_DEFAULT = {'queries': 20, 'repeated': 3}
+QUERY_BUDGETS = {
+    'admin:*': {'queries': 30},
+}
+QUERY_BUDGET_ACTION = os.getenv('QUERY_BUDGET_ACTION', 'log')
@@ -0,0 +1,35 @@
+"""
+Test settings for yatube project.
+
+pytest loads this module as a whole (pytest.ini); manage.py test
+applies OVERRIDES on top of the regular settings through
+core.test_runner.TestRunner.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES
+
+# Свой файл кеша на каждый запуск: параллельные прогоны не мешают
+# друг другу и рабочему cache.sqlite3.
+TEST_CACHE_DIR = tempfile.mkdtemp(prefix='yatube-test-cache-')
+atexit.register(shutil.rmtree, TEST_CACHE_DIR, True)
+
+OVERRIDES = {
+    'CACHES': {
+        'default': dict(
+            CACHES['default'],
+            LOCATION=os.path.join(TEST_CACHE_DIR, 'cache.sqlite3')
+        ),
+    },
+    # Пул не запускается: процессы дописывали бы файлы в MEDIA_ROOT,
+    # который тесты уже удалили.
+    'THUMBNAIL_WORKERS': 0,
+    'QUERY_BUDGET_ACTION': 'raise',
+}
+
+globals().update(OVERRIDES)